@@ -5,34 +5,56 @@ Created on Mon Aug  1 11:43:38 2022
 @author: bryan
 """
 
-from difflib import SequenceMatcher as sm
+from operator import attrgetter
+import numpy as np
 from Chunk import Chunk
+from CombinerStats import NULL_STATS
+from token_matching import first_match, longest_match, longest_match_at_least
 
 MIN_GRAM_LEN = 6
 MIN_OVERLAP_GRAM_LEN = 3 #How much of an overlap between Blocks will automatically trigger a merge?
 OVERLY_LONG_OVERLAP = 10 #How long must an
 MIN_REMAINDER_CHECK_THRESH = 10
 
+_block_idx = attrgetter('block_idx')
+_size = attrgetter('size')
+_source = attrgetter('source')
+
+'''Token sequences in Blocks are normally NumPy arrays of token ids (see Vocabulary), but plain
+    lists of words work as well. This compares either kind'''
+def _same_tokens(x, y):
+    if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+        return np.array_equal(x, y)
+    return list(x) == list(y)
+
 class Block:
 
-    def __init__(self, *args):
+    '''Blocks are built either from a single overlap, Block(x, x0, y, y0, size, text), or from a list
+        of chunks, Block(chunks). vocab is the cluster's Vocabulary when the text is stored as token
+        ids, and is passed on to any Blocks built from this one, as is stats (see CombinerStats).
+        source_min_max can be passed in when it's already known (see merge_block), rather than
+        recomputed from every chunk'''
+    def __init__(self, *args, vocab = None, stats = None, source_min_max = None):
+        self.vocab = vocab
+        self.stats = stats if stats is not None else NULL_STATS
         if len(args) == 6:
             x, x0, y, y0, size, text = args
             self.chunks = [Chunk(x, 0, x0, size, text), Chunk(y, 0, y0, size, text)]
             self.merged_text = text
+            self.frontiers = [len(text), len(text)]
             self.sources = set([x, y])
 
         elif len(args) == 1:
             chunks = args[0]
-            self.chunks = sorted(chunks, key = lambda x: x.block_idx)
-            self.sources = set([chunk.source for chunk in self.chunks])
+            self.chunks = sorted(chunks, key = _block_idx)
+            self.sources = set(map(_source, self.chunks))
             self.recompute_indexes()
             self.recompile_text()
 
         else:
             raise ValueError('Invalid Arguments to Block!')
 
-        self.source_min_max = self.get_source_min_max()
+        self.source_min_max = source_min_max if source_min_max is not None else self.get_source_min_max()
         self.banned_sources = set()
 
 
@@ -64,7 +86,7 @@ class Block:
 
         new_block_chunks = [c.trim_to_slice(start, stop) for c in self.chunks]
         new_block_chunks = [c for c in new_block_chunks if c is not None]
-        return Block(new_block_chunks)
+        return Block(new_block_chunks, vocab = self.vocab, stats = self.stats)
 
     def get_source_min_max(self):
         min_max_idxs = {source: {'min_idx': 1e10, 'max_idx': 0} for source in self.sources}
@@ -95,26 +117,121 @@ class Block:
 
         return closest_block_idx + min_dist
 
+    '''Shifts the (sorted) chunks so the first starts at block index 0'''
     def recompute_indexes(self):
-        min_index = 1e10
-        for chunk in self.chunks:
-            if chunk.block_idx < min_index:
-                min_index = chunk.block_idx
+        min_index = self.chunks[0].block_idx if self.chunks else 0
+        if min_index:
+            for chunk in self.chunks:
+                chunk.block_idx -= min_index
 
-        for i in range(len(self.chunks)):
-            self.chunks[i].block_idx -= min_index
 
+    '''Rebuilds merged_text from the (sorted) chunks: each chunk that reaches the end of the text so far
+        extends it. frontiers keeps the length of the text after each chunk, which lets _insert_chunks
+        patch the text rather than rebuilding it.
 
+        Chunks are sorted by block index, so the text so far is just the furthest any chunk has reached, up
+        until the first chunk starting past that--after which no later chunk can reach the text either. That
+        is worked out for all the chunks at once, and only the chunks that add text get sliced. A chunk at the
+        end of its source can have less text than its size though, in which case this falls back to going
+        through the chunks one by one'''
     def recompile_text(self):
+        n = len(self.chunks)
+        starts = np.fromiter(map(_block_idx, self.chunks), dtype = np.int64, count = n)
+        ends = starts + np.fromiter(map(_size, self.chunks), dtype = np.int64, count = n)
+
+        #reach[k] is the length of the text before chunk k (until the first gap)
+        reach = np.maximum.accumulate(np.concatenate((np.zeros(1, dtype = np.int64), ends)))
+        gaps = np.flatnonzero(starts > reach[:-1])
+        stop = gaps[0] if len(gaps) else n
+
+        text = [self.chunks[k].text_from(int(reach[k] - starts[k])) for k in np.flatnonzero(ends[:stop] > reach[:stop])]
+        if sum(map(len, text)) != reach[stop]:
+            self._recompile_text_by_chunk()
+            return
+        frontiers = reach[1:]
+        frontiers[stop:] = reach[stop]
+        self.frontiers = frontiers.tolist()
+        self.merged_text = self._join_text(text)
+
+    def _recompile_text_by_chunk(self):
         text = []
+        self.frontiers = []
         cur_idx = 0
         for chunk in self.chunks:
             if chunk.block_idx <= cur_idx and chunk.block_idx + chunk.size >= cur_idx:
-                new_text = chunk.text[cur_idx - chunk.block_idx : ]
-                text.extend(new_text)
+                new_text = chunk.text_from(cur_idx - chunk.block_idx)
+                text.append(new_text)
                 cur_idx += len(new_text)
-
-        self.merged_text = text
+            self.frontiers.append(cur_idx)
+
+        self.merged_text = self._join_text(text)
+
+    def _join_text(self, pieces):
+        if self.vocab is None:
+            return [token for piece in pieces for token in piece]
+        pieces = [piece for piece in pieces if len(piece)]
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype = np.int32)
+
+    '''Adds new chunks (all starting at the same block index) to the block, giving exactly the same chunk order,
+        merged text and source bounds as recompute_indexes, a (stable) sort, recompile_text and
+        get_source_min_max would, without redoing all of that:
+            - the chunks go straight into their sorted position,
+            - merged_text is recompiled from the new chunks until the text after some later chunk is back to
+              where it was before (its frontier matches), after which the rest of the old text still holds,
+            - source_min_max is just updated with the new chunks'''
+    def _insert_chunks(self, new_chunks):
+        block_idx = new_chunks[0].block_idx
+        shift = -min(block_idx, self.chunks[0].block_idx) if self.chunks else -block_idx
+        if shift:
+            for chunk in self.chunks + new_chunks:
+                chunk.block_idx += shift
+
+        #Insert after any chunks with the same block index, as the sort would
+        lo, hi = 0, len(self.chunks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.chunks[mid].block_idx <= block_idx + shift:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo
+        self.chunks[pos:pos] = new_chunks
+
+        #Shifting moves where every chunk sits relative to the start of the text, so then start over
+        old_text, old_frontiers = self.merged_text, self.frontiers
+        start = 0 if shift else pos
+        cur_idx = old_frontiers[start - 1] if start > 0 else 0
+        prefix = old_text[:cur_idx]
+        text, frontiers, tail = [], [], None
+        for k in range(start, len(self.chunks)):
+            chunk = self.chunks[k]
+            if chunk.block_idx <= cur_idx and chunk.block_idx + chunk.size >= cur_idx:
+                new_text = chunk.text_from(cur_idx - chunk.block_idx)
+                text.append(new_text)
+                cur_idx += len(new_text)
+            frontiers.append(cur_idx)
+
+            old_k = k - len(new_chunks)
+            if k >= pos + len(new_chunks) and cur_idx == old_frontiers[old_k] + shift:
+                tail = old_text[old_frontiers[old_k]:]
+                frontiers.extend([f + shift for f in old_frontiers[old_k + 1:]])
+                break
+
+        self.merged_text = self._join_text([prefix] + text + ([tail] if tail is not None else []))
+        self.frontiers = old_frontiers[:start] + frontiers
+
+        for chunk in new_chunks:
+            self.sources.add(chunk.source)
+            bounds = self.source_min_max.setdefault(chunk.source, {'min_idx': 1e10, 'max_idx': 0})
+            if chunk.source_idx < bounds['min_idx']:
+                bounds['min_idx'] = chunk.source_idx
+            if chunk.source_idx + chunk.size > bounds['max_idx']:
+                bounds['max_idx'] = chunk.source_idx + chunk.size
+
+    def _lower(self, tokens):
+        if self.vocab is None:
+            return [x.lower() for x in tokens]
+        return self.vocab.lower(tokens)
 
     def check_overlap(self, block_idx, size, text):
         edge = False
@@ -131,20 +248,21 @@ class Block:
             seg_to_check = text
             check_idx = block_idx
 
-        if seg_to_check != self.merged_text[check_idx : check_idx + len(seg_to_check)]:
-            if [x.lower() for x in seg_to_check] == [x.lower() for x in self.merged_text[check_idx : check_idx + len(seg_to_check)]]:
+        block_seg = self.merged_text[check_idx : check_idx + len(seg_to_check)]
+        if not _same_tokens(seg_to_check, block_seg):
+            if _same_tokens(self._lower(seg_to_check), self._lower(block_seg)):
                 return True, None
             else:
+                self.stats.count('match_calls')
+                self.stats.count('tokens_aligned', len(seg_to_check) + len(block_seg))
                 if edge:
-                    matcher = sm(a = seg_to_check, b = self.merged_text[check_idx : check_idx + len(seg_to_check)], autojunk = False)
-                    top_start_match = sorted(matcher.get_matching_blocks(), key = lambda x: (x[1], x[2] * -1))[0]
+                    top_start_match = first_match(seg_to_check, block_seg)
                     if top_start_match[2] > 3:
                         return True, top_start_match
                     else:
                         return False, None
                 else:
-                    matcher = sm(a = seg_to_check, b = self.merged_text[check_idx : check_idx + len(seg_to_check)], autojunk = False)
-                    long = matcher.find_longest_match(0, len(text), 0, len(seg_to_check))
+                    long = longest_match(seg_to_check, block_seg, 0, len(text), 0, len(seg_to_check))
                     if long[2] > MIN_GRAM_LEN:
                         return True, long
                     else:
@@ -167,23 +285,22 @@ class Block:
             block_idx += new_params[1]
 
         if overlap_qual:
-            self.chunks.extend([Chunk(x, block_idx, x0, size, text), Chunk(y, block_idx, y0, size, text)])
-            self.sources.add(y)
-            self.recompute_indexes()
-            self.chunks = sorted(self.chunks, key = lambda x: x.block_idx)
-            self.recompile_text()
-            self.source_min_max = self.get_source_min_max()
+            self._insert_chunks([Chunk(x, block_idx, x0, size, text), Chunk(y, block_idx, y0, size, text)])
         else:
             self.banned_sources.add(x)
             self.banned_sources.add(y)
 
     def adjust_block_indices(self, adjustment):
-        for chunk in self.chunks:
-            chunk.add_to_block_idx(-1 * adjustment)
+        if adjustment:
+            for chunk in self.chunks:
+                chunk.block_idx -= adjustment
 
     def merge_block(self, new_block):
-        matcher = sm(a = self.merged_text, b = new_block.merged_text, autojunk = False)
-        longest = matcher.find_longest_match(0, len(self.merged_text), 0, len(new_block.merged_text))
+        self.stats.count('match_calls')
+        self.stats.count('tokens_aligned', len(self.merged_text) + len(new_block.merged_text))
+        longest = longest_match_at_least(self.merged_text, new_block.merged_text, MIN_OVERLAP_GRAM_LEN + 1)
+        if longest is None:
+            return None
         self_start, new_start, overlap_len = longest
 
         #Once we have an overlap meeting the minimum threshold we can consider the merge,
@@ -233,13 +350,29 @@ class Block:
                 len(new_block.merged_text) - longest[1] - longest[2] > OVERLY_LONG_OVERLAP:
                     return None
 
-            self.adjust_block_indices(longest[0])
-            new_block.adjust_block_indices(longest[1])
-            merged_block = Block(self.chunks + new_block.chunks)
+            #Both chunk lists are sorted, so after lining them up the merged Block starts at the first chunk of
+            #one of them. Shifting by that too now saves the new Block shifting every chunk again
+            first = min(self.chunks[0].block_idx - longest[0], new_block.chunks[0].block_idx - longest[1])
+            self.adjust_block_indices(longest[0] + first)
+            new_block.adjust_block_indices(longest[1] + first)
+            merged_block = Block(self.chunks + new_block.chunks, vocab = self.vocab, stats = self.stats,
+                                 source_min_max = self._merged_source_min_max(new_block))
             return merged_block
         else:
             return None
 
+    '''source_min_max of a Block made of both Blocks' chunks: source indexes don't move when Blocks merge, so
+        it's just the widest bounds of each source in either Block'''
+    def _merged_source_min_max(self, new_block):
+        merged = {source: dict(bounds) for source, bounds in self.source_min_max.items()}
+        for source, bounds in new_block.source_min_max.items():
+            if source in merged:
+                merged[source]['min_idx'] = min(merged[source]['min_idx'], bounds['min_idx'])
+                merged[source]['max_idx'] = max(merged[source]['max_idx'], bounds['max_idx'])
+            else:
+                merged[source] = dict(bounds)
+        return merged
+
     def fuzzy_merge(self, new_block, dist, source, source_idx, inter_text):
         if dist < 0:
             new_max_idx = self.__len__() + dist
@@ -252,5 +385,5 @@ class Block:
             self.recompile_text()
 
         new_block.adjust_block_indices(self.__len__())
-        merged_block = Block(self.chunks + new_block.chunks)
+        merged_block = Block(self.chunks + new_block.chunks, vocab = self.vocab, stats = self.stats)
         return merged_block
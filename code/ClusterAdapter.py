@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Per-cluster fine tuning of a small subset of a frozen base model's weights, and an on-disk cache of
+the results, so a cluster's fine tune is only ever trained once.
+
+    adapter = ClusterAdapter(model, mode = 'bias')
+    cache = AdapterCache(cache_dir)
+
+    key = cache.key(model_name, cluster_id, texts, config)
+    delta = cache.get(key)
+    if delta is None:
+        adapter.reset()
+        ... fine tune model (only the adapter's parameters are trainable) ...
+        delta = adapter.delta()
+        cache.put(key, delta)
+    else:
+        adapter.apply(delta)
+
+Modes (which parameters get trained):
+    'bias'       - every bias (BitFit style)
+    'last_layer' - the last numbered layer (e.g. transformer.h.11.*) and the final norm(s) after it
+
+Everything else has requires_grad turned off. A delta is the change to each trained parameter from its
+base value, kept on the CPU, so swapping clusters is a copy of just those parameters rather than a
+reload of the whole model.
+"""
+
+import hashlib
+import json
+import os
+import re
+import torch
+
+ADAPTER_MODES = ('bias', 'last_layer')
+
+_LAYER_INDEX = re.compile(r'\.(\d+)\.')
+
+
+'''Names of the parameters a mode trains'''
+def adapter_parameter_names(model, mode = 'bias'):
+    if mode not in ADAPTER_MODES:
+        raise ValueError('Unknown adapter mode {}! Must be one of {}'.format(mode, ', '.join(ADAPTER_MODES)))
+    names = [name for name, _ in model.named_parameters()]
+
+    if mode == 'bias':
+        return [name for name in names if name.endswith('bias')]
+
+    layers = {name: int(match.group(1)) for name, match in zip(names, map(_LAYER_INDEX.search, names)) if match}
+    if not layers:
+        raise ValueError('Model has no numbered layers to take the last of')
+    last = max(layers.values())
+    return [name for name in names if layers.get(name) == last or
+            (name not in layers and ('ln_f' in name or 'norm' in name))]
+
+
+class ClusterAdapter:
+
+    '''Freezes every parameter of model except those the mode trains, and remembers their base values'''
+    def __init__(self, model, mode = 'bias'):
+        self.model = model
+        self.mode = mode
+        self.names = adapter_parameter_names(model, mode)
+
+        named = dict(model.named_parameters())
+        self.parameters = {name: named[name] for name in self.names}
+        for name, parameter in named.items():
+            parameter.requires_grad = name in self.parameters
+        self.base = {name: parameter.detach().to('cpu', copy = True) for name, parameter in self.parameters.items()}
+
+    '''Puts the trained parameters back to their base values'''
+    def reset(self):
+        with torch.no_grad():
+            for name, parameter in self.parameters.items():
+                parameter.copy_(self.base[name])
+
+    '''How far the trained parameters have moved from base, as a dict of CPU tensors'''
+    def delta(self):
+        return {name: parameter.detach().cpu() - self.base[name] for name, parameter in self.parameters.items()}
+
+    '''Sets the trained parameters to base + delta'''
+    def apply(self, delta):
+        if set(delta) != set(self.names):
+            raise ValueError('Delta is for different parameters than this {} adapter'.format(self.mode))
+        with torch.no_grad():
+            for name, parameter in self.parameters.items():
+                parameter.copy_(self.base[name] + delta[name])
+
+
+class AdapterCache:
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok = True)
+
+    '''Key for a cluster's delta: depends on the base model, the cluster, its training texts and whatever
+        else (adapter mode, learning rate, ...) is in config'''
+    def key(self, model_name, cluster_id, texts, config = None):
+        digest = hashlib.blake2b(digest_size = 16)
+        digest.update(json.dumps([model_name, str(cluster_id), config or {}], sort_keys = True).encode('utf-8'))
+        for text in texts:
+            digest.update(text.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pt')
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    '''The cached delta for key, or None'''
+    def get(self, key):
+        if key not in self:
+            return None
+        return torch.load(self._path(key))
+
+    '''Writes to a temporary file first, so a crash never leaves a half written delta behind'''
+    def put(self, key, delta):
+        tmp_path = self._path(key) + '.tmp'
+        torch.save(delta, tmp_path)
+        os.replace(tmp_path, self._path(key))
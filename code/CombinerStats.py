@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Optional instrumentation for NgramCombiner: wall time per phase of estimate_text and counters
+(match_calls, i.e. alignments of two texts by SequenceMatcher or token_matching, tokens aligned,
+merge attempts, ...).
+
+    stats = CombinerStats()
+    with stats.phase('find_overlaps'):
+        ...
+    stats.count('merge_attempts')
+
+When instrumentation is off, NgramCombiner (and its Blocks) use NULL_STATS instead, which has the
+same interface but does nothing, so the cost is a method call per phase/count.
+"""
+
+import time
+from collections import defaultdict
+
+
+class _Phase:
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stats.times[self.name] += time.perf_counter() - self.start_time
+
+
+class CombinerStats:
+
+    enabled = True
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    '''Context manager adding the wall time spent inside it to phase name'''
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, n = 1):
+        self.counts[name] += n
+
+    def as_dict(self):
+        return {'times': dict(self.times), 'counts': dict(self.counts)}
+
+
+class _NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+class NullStats:
+
+    enabled = False
+    _null_phase = _NullPhase()
+
+    def phase(self, name):
+        return self._null_phase
+
+    def count(self, name, n = 1):
+        pass
+
+    def as_dict(self):
+        return None
+
+
+NULL_STATS = NullStats()
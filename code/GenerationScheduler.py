@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Batched generation for the neural completion stage: prompts (e.g. the gaps of many clusters' blocks,
+see WireNeuralCombiner) are queued under a key, then generated together and handed back by key.
+
+    scheduler = GenerationScheduler(model, tokenizer)
+    scheduler.add((cluster_id, gap), prompt)
+    ...
+    outputs = scheduler.run()   #{(cluster_id, gap): generated text}
+
+Prompts are sorted by length and cut into batches (see plan_batches) so that no batch holds more than
+max_batch_tokens tokens once padded and generated (rows * (longest prompt + max_new_tokens)): short
+prompts go many to a batch, long ones few, and as prompts of similar length share a batch little of
+it is padding. Prompts are left padded, as a decoder-only model has to continue from the right edge.
+torch is only imported when generating.
+"""
+
+MAX_BATCH_TOKENS = 8192 #How many tokens (prompt and generated, padding included) can one batch hold?
+MAX_NEW_TOKENS = 40 #How many tokens are generated per prompt?
+
+
+'''Splits prompts of the given token lengths into batches (lists of indexes into lengths), shortest
+    prompts first, each as large as fits in max_batch_tokens. A prompt too long to share a batch gets
+    one of its own'''
+def plan_batches(lengths, max_batch_tokens = MAX_BATCH_TOKENS, max_new_tokens = MAX_NEW_TOKENS):
+    batches = []
+    batch = []
+    for k in sorted(range(len(lengths)), key = lambda x: lengths[x]):
+        #Sorted, so the newest prompt is always the batch's longest
+        if batch and (len(batch) + 1) * (lengths[k] + max_new_tokens) > max_batch_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(k)
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+class GenerationScheduler:
+
+    '''Any further keyword arguments are passed on to model.generate (greedy decoding by default)'''
+    def __init__(self, model, tokenizer, max_batch_tokens = MAX_BATCH_TOKENS, max_new_tokens = MAX_NEW_TOKENS,
+                 device = None, **generate_args):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_tokens = max_batch_tokens
+        self.max_new_tokens = max_new_tokens
+        self.device = device
+        self.generate_args = dict({'do_sample': False}, **generate_args)
+        self.requests = []
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, key, prompt):
+        self.requests.append((key, prompt))
+
+    '''Generates every queued prompt, and returns a dict of key -> generated text (without its prompt). The
+        queue is emptied'''
+    def run(self):
+        import torch
+
+        requests, self.requests = self.requests, []
+        if not requests:
+            return {}
+
+        encoded = self.tokenizer([prompt for _, prompt in requests])['input_ids']
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+
+        self.model.eval()
+        outputs = {}
+        for batch in plan_batches([len(ids) for ids in encoded], self.max_batch_tokens, self.max_new_tokens):
+            width = max(len(encoded[k]) for k in batch)
+            input_ids = torch.full((len(batch), width), pad_token_id, dtype = torch.long)
+            attention_mask = torch.zeros_like(input_ids)
+            for row, k in enumerate(batch):
+                input_ids[row, width - len(encoded[k]):] = torch.tensor(encoded[k], dtype = torch.long)
+                attention_mask[row, width - len(encoded[k]):] = 1
+            if self.device:
+                input_ids, attention_mask = input_ids.to(self.device), attention_mask.to(self.device)
+
+            with torch.no_grad():
+                generated = self.model.generate(input_ids, attention_mask = attention_mask, max_new_tokens = self.max_new_tokens,
+                                                pad_token_id = pad_token_id, **self.generate_args)
+
+            texts = self.tokenizer.batch_decode(generated[:, width:], skip_special_tokens = True)
+            for k, text in zip(batch, texts):
+                outputs[requests[k][0]] = text
+
+        return outputs
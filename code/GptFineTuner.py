@@ -5,8 +5,14 @@ Created on Tue Aug 16 11:03:29 2022
 @author: bryan
 
 Methods to finetune some given model on a subset of wire cluster data.
+
+fine_tune(batch_size = n) trains in batches: the cluster's tokenized articles are packed greedily into
+rows of up to max_seq_len tokens (see pack_sequences), n rows at a time are padded into one batch with
+an attention mask and labels (see collate_rows), and with accumulation_steps > 1 the gradients of that
+many batches are summed before each optimizer step.
 """
 
+import math
 import pandas as pd
 import numpy as np
 import torch
@@ -16,18 +22,35 @@ from tqdm import tqdm
 import torch.nn.functional as F
 
 MAX_SEQ_LEN = 768
+IGNORE_INDEX = -100 #Label the loss ignores
 
 class GptFineTuner:
 
+    '''training_data is either a DataFrame of the cluster's articles (columns cluster_id and text), tokenized
+        here, or an already built WireSet (e.g. WireSet.from_tokenized)'''
     def __init__(self, cur_model, tokenizer, training_data,
                  max_seq_len = MAX_SEQ_LEN):
 
-        self.wire_set = WireSet(training_data, tokenizer)
+        if isinstance(training_data, WireSet):
+            self.wire_set = training_data
+        else:
+            self.wire_set = WireSet(training_data, tokenizer)
         self.tokenizer = tokenizer
         self.model = cur_model
 
         self.input_tensor = None
         self.max_seq_len = max_seq_len
+        self.optimizer = None
+
+    '''Only the parameters that require grad (all of them, unless e.g. a ClusterAdapter froze the rest)'''
+    def _trainable_parameters(self):
+        return [parameter for parameter in self.model.parameters() if parameter.requires_grad]
+
+    def _make_optimizer(self, lr, optimizer = None):
+        if optimizer is None:
+            optimizer = AdamW(self._trainable_parameters(), lr = lr)
+        self.optimizer = optimizer
+        return optimizer
 
     def _pack_tensor(self, new_tensor):
         if self.input_tensor is None:
@@ -41,7 +64,16 @@ class GptFineTuner:
             self.input_tensor = torch.cat([new_tensor, self.input_tensor[:, 1:]], dim = 1)
             return None
 
-    def fine_tune(self, device = None, lr = 2e-5, n_epochs = 3):
+    '''Fine tunes the model on the cluster's articles. Without a batch_size, each packed sequence is its own
+        optimizer step, as it always has been; with one, trains in padded batches of batch_size packed rows
+        (stepping every accumulation_steps batches).
+
+        An optimizer over the model's parameters can be passed in to be reused (see WeightSnapshot.reset_optimizer),
+        otherwise a new AdamW is made. Either way it's left in self.optimizer'''
+    def fine_tune(self, device = None, lr = 2e-5, n_epochs = 3, batch_size = None, accumulation_steps = 1,
+                  optimizer = None):
+        if batch_size is not None:
+            return self._fine_tune_batched(device, lr, n_epochs, batch_size, accumulation_steps, optimizer)
 
         if device:
             self.model.cuda()
@@ -49,7 +81,7 @@ class GptFineTuner:
 
         self.model.train()
 
-        optimizer = AdamW(self.model.parameters(), lr = lr)
+        optimizer = self._make_optimizer(lr, optimizer)
         train_dataloader = DataLoader(self.wire_set, batch_size = 1, shuffle = True)
         loss = 0
 
@@ -62,18 +94,92 @@ class GptFineTuner:
                 packed_input = self._pack_tensor(entry)
                 if packed_input is None:
                     continue
+                self._train_step(packed_input, optimizer, device)
+
+            #Whatever is still packed when the epoch runs out (for small clusters, everything)
+            if self.input_tensor is not None:
+                self._train_step(self.input_tensor, optimizer, device)
+
+        return self.model
+
+    '''One optimizer step on a packed sequence, as a language model: the labels are the inputs (the model
+        shifts them)'''
+    def _train_step(self, packed_input, optimizer, device):
+        packed_input = packed_input.to(device)
+        outputs = self.model(packed_input, labels = packed_input)
+        loss = outputs.loss
+        loss.backward()
+
+        optimizer.step()
+        optimizer.zero_grad()
+
+    def _fine_tune_batched(self, device, lr, n_epochs, batch_size, accumulation_steps, optimizer = None):
+        if device:
+            device = torch.device(device)
+            self.model.to(device)
 
-                packed_input = packed_input.to(device)
-                outputs = self.model(packed_input)
-                loss = outputs.loss
+        self.model.train()
+
+        optimizer = self._make_optimizer(lr, optimizer)
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+
+        for epoch in range(n_epochs):
+
+            #Fresh order (so fresh rows) every epoch
+            order = torch.randperm(len(self.wire_set)).tolist()
+            rows = pack_sequences([self.wire_set[k] for k in order], self.max_seq_len)
+            n_batches = math.ceil(len(rows) / batch_size)
+
+            for b in range(n_batches):
+                batch = collate_rows(rows[b * batch_size : (b + 1) * batch_size], pad_token_id)
+                if device:
+                    batch = {name: tensor.to(device) for name, tensor in batch.items()}
+
+                outputs = self.model(**batch)
+                loss = outputs.loss / accumulation_steps
                 loss.backward()
 
-                optimizer.step()
-                optimizer.zero_grad()
+                if (b + 1) % accumulation_steps == 0 or b + 1 == n_batches:
+                    optimizer.step()
+                    optimizer.zero_grad()
 
         return self.model
 
 
+'''Greedily packs token sequences (1-D tensors) into rows of at most max_seq_len tokens: each sequence goes
+    into the first row it still fits in, or starts a new one. Sequences longer than max_seq_len are cut to it.
+    Returns the rows, each a list of sequences'''
+def pack_sequences(sequences, max_seq_len):
+    rows = []
+    row_lens = []
+    for sequence in sequences:
+        sequence = sequence[:max_seq_len]
+        for k in range(len(rows)):
+            if row_lens[k] + len(sequence) <= max_seq_len:
+                rows[k].append(sequence)
+                row_lens[k] += len(sequence)
+                break
+        else:
+            rows.append([sequence])
+            row_lens.append(len(sequence))
+
+    return rows
+
+'''Pads packed rows into a batch of input_ids, attention_mask and labels (number of rows x longest row). Padding
+    is masked out of attention and labelled IGNORE_INDEX, so it doesn't count towards the loss'''
+def collate_rows(rows, pad_token_id):
+    row_lens = [sum(len(sequence) for sequence in row) for row in rows]
+    input_ids = torch.full((len(rows), max(row_lens)), pad_token_id, dtype = torch.long)
+    attention_mask = torch.zeros_like(input_ids)
+    for k, row in enumerate(rows):
+        input_ids[k, :row_lens[k]] = torch.cat(row)
+        attention_mask[k, :row_lens[k]] = 1
+
+    labels = input_ids.masked_fill(attention_mask == 0, IGNORE_INDEX)
+    return {'input_ids': input_ids, 'attention_mask': attention_mask, 'labels': labels}
+
 
 class WireSet(Dataset):
     def __init__(self, texts_df, tokenizer, max_len = 1024):
@@ -89,8 +195,21 @@ class WireSet(Dataset):
 
         self.texts_count = len(self.texts)
 
+    '''A WireSet of one cluster's articles from a TokenizedCorpus, without tokenizing anything: its texts are
+        views into the corpus' memory-mapped tokens, only made into tensors as they're used'''
+    @classmethod
+    def from_tokenized(cls, tokenized_corpus, cluster_id, tokenizer = None):
+        wire_set = cls.__new__(cls)
+        wire_set.tokenizer = tokenizer
+        wire_set.texts = tokenized_corpus.cluster_sequences(cluster_id)
+        wire_set.texts_count = len(wire_set.texts)
+        return wire_set
+
     def __len__(self):
         return self.texts_count
 
     def __getitem__(self, item):
-        return self.texts[item]
\ No newline at end of file
+        text = self.texts[item]
+        if isinstance(text, np.ndarray):
+            return torch.from_numpy(text).long()
+        return text
\ No newline at end of file
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Cluster-wide n-gram index for finding overlaps between the articles of a wire cluster.
+
+Rather than aligning every pair of articles separately, NgramIndex hashes every
+(min_len + 1)-gram of every article in the cluster into a single table. Any shared run
+of more than min_len tokens between two articles must share one of those grams, so a
+single pass over the table finds the start of every maximal shared run. Runs only start
+where the tokens preceding both occurrences differ, so postings are grouped by their
+preceding token and only pairs across groups are looked at--long passages repeated
+across the whole cluster cost (close to) nothing beyond the runs they actually produce.
+
+The runs for each pair of articles are then reduced to exactly the set of blocks that
+difflib.SequenceMatcher.get_matching_blocks would have returned (restricted to those
+longer than min_len), in the same order, so NgramIndex can be swapped in for the pairwise
+SequenceMatcher loop in NgramCombiner._find_overlaps without changing any results.
+"""
+
+from collections import defaultdict
+import numpy as np
+
+
+class NgramIndex:
+
+    '''Takes in the (tokenized) articles of a cluster and the length a match must exceed to be
+        reported, and builds the gram table up front
+    '''
+    def __init__(self, article_set, min_len):
+        self.article_set = article_set
+        self.min_len = min_len
+        self.gram_len = min_len + 1
+        self.gram_table = self._build_table()
+
+    def _build_table(self):
+        gram_table = defaultdict(list)
+        for a, article in enumerate(self.article_set):
+            article = np.asarray(article).tolist()
+            for p in range(len(article) - self.gram_len + 1):
+                gram_table[tuple(article[p : p + self.gram_len])].append((a, p))
+
+        return gram_table
+
+    '''Finds every maximal run of at least gram_len tokens shared between two different articles.
+        Returns a dict keyed by article pair (i, j), i < j, of lists of (i_start, j_start, size)
+    '''
+    def find_runs(self):
+        runs = defaultdict(list)
+        articles = [np.asarray(article).tolist() for article in self.article_set]
+
+        for postings in self.gram_table.values():
+            if len(postings) < 2:
+                continue
+
+            #Group the occurrences by the token preceding them. Occurrences at the start of an
+            #article get a group of their own, as they start a run with every other occurrence
+            groups = defaultdict(list)
+            for a, p in postings:
+                groups[articles[a][p - 1] if p > 0 else (a, p)].append((a, p))
+            if len(groups) < 2:
+                continue
+
+            groups = list(groups.values())
+            for g in range(len(groups) - 1):
+                for h in range(g + 1, len(groups)):
+                    for a, p in groups[g]:
+                        for b, q in groups[h]:
+                            if a < b:
+                                runs[(a, b)].append((p, q, self._extend_run(articles[a], p, articles[b], q)))
+                            elif a > b:
+                                runs[(b, a)].append((q, p, self._extend_run(articles[b], q, articles[a], p)))
+
+        return runs
+
+    def _extend_run(self, a_text, p, b_text, q):
+        size = self.gram_len
+        max_size = min(len(a_text) - p, len(b_text) - q)
+        while size < max_size and a_text[p + size] == b_text[q + size]:
+            size += 1
+        return size
+
+    '''Reduces the maximal runs between two articles to the blocks SequenceMatcher would find:
+        the longest match in the full range, then recursively the longest matches before and after
+        it. Ties go to the match starting earliest in a, then earliest in b, as in
+        SequenceMatcher.find_longest_match. Only blocks longer than min_len are kept, sorted by
+        size (longest first) and then by position, just as in the pairwise loop
+    '''
+    def select_blocks(self, runs, a_len, b_len):
+        matching_blocks = []
+        queue = [(0, a_len, 0, b_len)]
+
+        while queue:
+            alo, ahi, blo, bhi = queue.pop()
+            best_i, best_j, best_size = alo, blo, 0
+
+            for p, q, size in runs:
+                diag = q - p
+                start = max(p, alo, blo - diag)
+                stop = min(p + size, ahi, bhi - diag)
+                k = stop - start
+                if k > best_size or (k == best_size and k > 0 and (start, start + diag) < (best_i, best_j)):
+                    best_i, best_j, best_size = start, start + diag, k
+
+            if best_size > self.min_len:
+                matching_blocks.append((best_i, best_j, best_size))
+                if alo < best_i and blo < best_j:
+                    queue.append((alo, best_i, blo, best_j))
+                if best_i + best_size < ahi and best_j + best_size < bhi:
+                    queue.append((best_i + best_size, ahi, best_j + best_size, bhi))
+
+        matching_blocks.sort()
+        return sorted(matching_blocks, key = lambda x: x[2], reverse = True)
+
+    '''Main entry point. Yields ((i, j), blocks) for every pair of articles sharing at least
+        one run longer than min_len, in the same (i, j) order as the pairwise loop
+    '''
+    def pair_overlaps(self):
+        runs = self.find_runs()
+        for i, j in sorted(runs.keys()):
+            yield (i, j), self.select_blocks(runs[(i, j)], len(self.article_set[i]), len(self.article_set[j]))
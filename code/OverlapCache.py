@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the pairwise overlaps (SequenceMatcher matching blocks) NgramCombiner finds between
+two articles, so reruns, parameter sweeps and overlapping cluster files don't pay for aligning the
+same pair of articles twice.
+
+Entries are keyed by hashes of the two (sanitized) token sequences, in order, plus MIN_GRAM_LEN, and
+live in a SQLite database. Once there are more than max_entries, the least recently used entries get
+evicted. hits and misses count lookups since the cache was opened.
+
+The database can be shared between processes (e.g. WireFileCombiner pool workers each opening it),
+SQLite takes care of the locking. The number of entries is counted once at open and then kept up to
+date as entries are added and evicted, so entries other processes add only count towards max_entries
+once the cache is reopened.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+MAX_CACHE_ENTRIES = 1000000 #How many article pairs are kept before the least recently used get evicted?
+
+
+class OverlapCache:
+
+    def __init__(self, path, min_gram_len, max_entries = MAX_CACHE_ENTRIES):
+        self.path = path
+        self.min_gram_len = min_gram_len
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path, timeout = 60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS overlaps (key BLOB PRIMARY KEY, blocks TEXT, last_used INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS overlaps_last_used ON overlaps (last_used)')
+        self.connection.commit()
+        self.clock = self.connection.execute('SELECT COALESCE(MAX(last_used), 0) FROM overlaps').fetchone()[0]
+        self.n_entries = self.connection.execute('SELECT COUNT(*) FROM overlaps').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __len__(self):
+        return self.n_entries
+
+    def close(self):
+        self.connection.close()
+
+    '''Hash of an article's token sequence (a list of words)'''
+    @staticmethod
+    def sequence_hash(tokens):
+        return hashlib.blake2b(' '.join(tokens).encode('utf-8'), digest_size = 16).digest()
+
+    def _key(self, a_hash, b_hash):
+        return a_hash + b_hash + str(self.min_gram_len).encode('utf-8')
+
+    def _tick(self):
+        self.clock += 1
+        return self.clock
+
+    '''Looks up the overlaps of a list of (a_hash, b_hash) pairs. Returns a list with the cached overlaps
+        (a list of (a_start, b_start, size)) of each pair, or None where the pair isn't cached'''
+    def get_many(self, hash_pairs):
+        found = []
+        touched = []
+        for a_hash, b_hash in hash_pairs:
+            key = self._key(a_hash, b_hash)
+            row = self.connection.execute('SELECT blocks FROM overlaps WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                found.append(None)
+            else:
+                self.hits += 1
+                found.append([tuple(block) for block in json.loads(row[0])])
+                touched.append((self._tick(), key))
+
+        if touched:
+            self.connection.executemany('UPDATE overlaps SET last_used = ? WHERE key = ?', touched)
+            self.connection.commit()
+        return found
+
+    '''Stores the overlaps of a list of ((a_hash, b_hash), overlaps) pairs, then evicts down to max_entries'''
+    def put_many(self, entries):
+        rows = [(self._key(a_hash, b_hash), json.dumps([list(block) for block in overlaps]), self._tick())
+                for (a_hash, b_hash), overlaps in entries]
+        n_new = self.connection.executemany('INSERT OR IGNORE INTO overlaps (key, blocks, last_used) VALUES (?, ?, ?)', rows).rowcount
+        if n_new < len(rows):
+            self.connection.executemany('UPDATE overlaps SET blocks = ?, last_used = ? WHERE key = ?',
+                                        [(blocks, last_used, key) for key, blocks, last_used in rows])
+        self.n_entries += n_new
+
+        n_over = self.n_entries - self.max_entries
+        if n_over > 0:
+            self.n_entries -= self.connection.execute('DELETE FROM overlaps WHERE key IN (SELECT key FROM overlaps ORDER BY last_used LIMIT ?)',
+                                                      (n_over,)).rowcount
+        self.connection.commit()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self)}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Streams the results of WireFileCombiner.merge_texts to disk as they finish, rather than holding them all
+in memory for output_all at the very end.
+
+Each finished cluster is appended to a JSONL file as one {"cluster_id": ..., "results": {...}} record.
+Records are flushed as they're written and fsynced every fsync_every records (and on close), so a crash
+loses at most the last few clusters. Opening a ResultWriter on an existing output file picks up where
+it left off: the clusters already in it go into done_ids (so merge_texts can skip them), and a last
+record cut short by a crash is dropped.
+
+compact() writes everything back out as a single json in the same format output_all does, for anything
+expecting that.
+"""
+
+import json
+import os
+
+FSYNC_EVERY = 20 #How many records are written between fsyncs?
+
+
+class ResultWriter:
+
+    def __init__(self, outpath, fsync_every = FSYNC_EVERY):
+        self.outpath = outpath
+        self.fsync_every = fsync_every
+        self.done_ids = set()
+        self.n_unsynced = 0
+
+        if os.path.exists(outpath):
+            self._resume()
+        self.outfile = open(outpath, 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    '''Reads the ids already written, truncating the file after the last complete record'''
+    def _resume(self):
+        good_len = 0
+        with open(self.outpath, 'rb') as infile:
+            for line in infile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                self.done_ids.add(record['cluster_id'])
+                good_len += len(line)
+
+        if good_len < os.path.getsize(self.outpath):
+            with open(self.outpath, 'r+b') as outfile:
+                outfile.truncate(good_len)
+
+    def __contains__(self, k):
+        return k in self.done_ids
+
+    def write(self, k, results_dict):
+        self.outfile.write(json.dumps({'cluster_id': k, 'results': results_dict}) + '\n')
+        self.outfile.flush()
+        self.done_ids.add(k)
+
+        self.n_unsynced += 1
+        if self.n_unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self.outfile.flush()
+        os.fsync(self.outfile.fileno())
+        self.n_unsynced = 0
+
+    def close(self):
+        if not self.outfile.closed:
+            self.sync()
+            self.outfile.close()
+
+    '''Writes all the results so far to a single json at json_path, formatted as WireFileCombiner.output_all does'''
+    def compact(self, json_path):
+        if not self.outfile.closed:
+            self.sync()
+        with open(json_path, 'w') as outfile:
+            json.dump(read_results(self.outpath), outfile, indent = 4)
+
+
+'''Reads a ResultWriter output file back into a dict of cluster id -> results, in the order they were written.
+    A last record cut short by a crash is ignored'''
+def read_results(path):
+    results = {}
+    with open(path, 'r') as infile:
+        for line in infile:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            results[record['cluster_id']] = record['results']
+
+    return results
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Index over the overlaps of a single source (article), replacing the plain list in
+NgramCombiner.overlap_dict[source]. Overlaps are (start_idx, size, other_source, other_start_idx)
+tuples, just as before.
+
+The overlaps keep the order they were added in (iterating gives the same order the list did),
+and additionally are sorted by start index, so "which overlaps straddle this index" only has to
+look at overlaps starting at most max_size tokens before it rather than at every overlap of
+the source. Removal just unlinks the overlap, and the sorted starts get compacted once more than
+half of them are dead.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+class SourceOverlapIndex:
+
+    def __init__(self, overlaps = ()):
+        self.overlaps = list(overlaps)
+        self.positions = {overlap: n for n, overlap in enumerate(self.overlaps)}
+        self.alive = [True] * len(self.overlaps)
+        self.n_alive = len(self.overlaps)
+
+        #Linked list over the alive overlaps, in the order they were added
+        self.prev = list(range(-1, len(self.overlaps) - 1))
+        self.next = list(range(1, len(self.overlaps) + 1))
+        self.head = 0
+
+        self.max_size = max([overlap[1] for overlap in self.overlaps], default = 0)
+        self._sort_starts()
+
+    def _sort_starts(self):
+        self.by_start = sorted([n for n in range(len(self.overlaps)) if self.alive[n]], key = lambda n: self.overlaps[n][0])
+        self.starts = [self.overlaps[n][0] for n in self.by_start]
+
+    def __len__(self):
+        return self.n_alive
+
+    def __contains__(self, overlap):
+        n = self.positions.get(overlap)
+        return n is not None and self.alive[n]
+
+    def __iter__(self):
+        n = self.head
+        while n < len(self.overlaps):
+            yield self.overlaps[n]
+            n = self.next[n]
+
+    def remove(self, overlap):
+        if overlap not in self:
+            raise ValueError('SourceOverlapIndex.remove(x): x not in index')
+        self._unlink(self.positions[overlap])
+
+    def _unlink(self, n):
+        self.alive[n] = False
+        self.n_alive -= 1
+        if self.prev[n] >= 0:
+            self.next[self.prev[n]] = self.next[n]
+        else:
+            self.head = self.next[n]
+        if self.next[n] < len(self.overlaps):
+            self.prev[self.next[n]] = self.prev[n]
+
+        if len(self.starts) > 2 * self.n_alive:
+            self._sort_starts()
+
+    '''Positions of the alive overlaps with start_idx < idx < start_idx + size'''
+    def _straddling(self, idx):
+        lo, hi = bisect_right(self.starts, idx - self.max_size), bisect_left(self.starts, idx)
+        return [n for n in self.by_start[lo : hi] if self.alive[n] and self.overlaps[n][0] + self.overlaps[n][1] > idx]
+
+    '''Removes and returns (in order) the overlaps straddling min_idx or max_idx. This gives exactly what
+        looping over the old overlap list and removing matches as we went did--including that removing an
+        overlap mid-loop made the loop skip the overlap right after it (which then waits for the next pass)'''
+    def pop_straddling(self, min_idx, max_idx):
+        matches = sorted(set(self._straddling(min_idx) + self._straddling(max_idx)))
+
+        removed = []
+        removed_set = set()
+        for n in matches:
+            if self.prev[n] in removed_set:
+                continue
+            removed.append(n)
+            removed_set.add(n)
+
+        for n in removed:
+            self._unlink(n)
+
+        return [self.overlaps[n] for n in removed]
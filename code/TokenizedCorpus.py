@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+The GPT training data of a whole wire cluster file, tokenized once and stored memory-mapped, so the
+per-cluster fine tunes don't each re-tokenize their cluster (see WireSet.from_tokenized).
+
+    TokenizedCorpus.build(path, corpus.training_frame(), tokenizer)
+    tokenized = TokenizedCorpus(path)
+    wire_set = WireSet.from_tokenized(tokenized, cluster_id)
+
+path is a directory holding:
+    tokens.npy  - every article's tokens, one after another (int32)
+    offsets.npy - where each article starts in tokens, plus the end (int64, n_articles + 1)
+    meta.json   - the cluster ids, the index of each cluster's first article (plus the end), the
+                  tokenizer and max_len the tokens were made with, and a hash of the training text
+                  (source_hash), so a corpus built from another file's text isn't mistaken for this one's
+
+Articles are encoded exactly as WireSet always has (f"<|{cluster}|>{text[:max_len]}<|endoftext|>"),
+but in batches of ENCODE_BATCH_SIZE through the tokenizer's batch call. The arrays are opened
+copy-on-write memory-mapped, so a cluster's articles are views into the file's pages, which are read
+only as needed and shared between processes.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+ENCODE_BATCH_SIZE = 1000 #How many articles are sent to the tokenizer at once?
+MAX_TEXT_LEN = 1024 #Characters of each article kept, as in WireSet
+
+
+class TokenizedCorpus:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as infile:
+            meta = json.load(infile)
+        self.tokenizer_name = meta['tokenizer']
+        self.max_len = meta['max_len']
+        self.source_hash = meta.get('source_hash')
+        self.cluster_ids = meta['cluster_ids']
+        self.cluster_starts = meta['cluster_starts']
+        self.cluster_index = {cluster_id: k for k, cluster_id in enumerate(self.cluster_ids)}
+
+        self.tokens = np.load(os.path.join(path, 'tokens.npy'), mmap_mode = 'c')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode = 'c')
+
+    def __len__(self):
+        return len(self.cluster_ids)
+
+    def __contains__(self, cluster_id):
+        return str(cluster_id) in self.cluster_index
+
+    '''The cluster's articles' tokens, as a list of views into the memory-mapped token array'''
+    def cluster_sequences(self, cluster_id):
+        k = self.cluster_index[str(cluster_id)]
+        first, end = self.cluster_starts[k], self.cluster_starts[k + 1]
+        return [self.tokens[self.offsets[i] : self.offsets[i + 1]] for i in range(first, end)]
+
+    '''Was this corpus made from this training frame, with this tokenizer?'''
+    def matches(self, texts_df, tokenizer):
+        return (self.tokenizer_name == getattr(tokenizer, 'name_or_path', None)
+                and self.source_hash == TokenizedCorpus.source_hash(self._prompts(texts_df, self.max_len)))
+
+    @staticmethod
+    def _prompts(texts_df, max_len):
+        return [f"<|{cluster}|>{text[:max_len]}<|endoftext|>" for text, cluster in zip(texts_df['text'], texts_df['cluster_id'])]
+
+    '''Hash of the text that gets tokenized (every article's prompt, in order)'''
+    @staticmethod
+    def source_hash(prompts):
+        digest = hashlib.blake2b(digest_size = 16)
+        for prompt in prompts:
+            digest.update(prompt.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    '''Tokenizes a training frame (columns cluster_id and text, each cluster's articles together, as
+        WireCorpus.training_frame gives) and writes it to path'''
+    @staticmethod
+    def build(path, texts_df, tokenizer, max_len = MAX_TEXT_LEN):
+        cluster_ids = [str(cluster) for cluster in texts_df['cluster_id']]
+        starts = [k for k in range(len(cluster_ids)) if k == 0 or cluster_ids[k] != cluster_ids[k - 1]]
+        unique_ids = [cluster_ids[k] for k in starts]
+        if len(set(unique_ids)) != len(unique_ids):
+            raise ValueError('Each cluster\'s articles must be together in the training frame')
+
+        prompts = TokenizedCorpus._prompts(texts_df, max_len)
+
+        encoded = []
+        for start in range(0, len(prompts), ENCODE_BATCH_SIZE):
+            encoded.extend(tokenizer(prompts[start : start + ENCODE_BATCH_SIZE])['input_ids'])
+
+        offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+        offsets[1:] = np.cumsum([len(ids) for ids in encoded])
+        tokens = np.fromiter((token for ids in encoded for token in ids), dtype = np.int32, count = offsets[-1])
+
+        os.makedirs(path, exist_ok = True)
+        np.save(os.path.join(path, 'tokens.npy'), tokens)
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        with open(os.path.join(path, 'meta.json'), 'w') as outfile:
+            json.dump({'tokenizer': getattr(tokenizer, 'name_or_path', None), 'max_len': max_len,
+                       'cluster_ids': unique_ids, 'cluster_starts': starts + [len(cluster_ids)],
+                       'source_hash': TokenizedCorpus.source_hash(prompts)}, outfile)
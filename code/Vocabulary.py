@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Per-cluster vocabulary. Maps each distinct token (word) in a cluster to an int32 id, so articles,
+Chunks and Blocks can hold their text as NumPy id arrays--comparing, slicing and matching ids is
+much cheaper than doing the same with lists of Python strings. Strings only get rebuilt (decode)
+when results are written out.
+
+Also keeps the lowercased id of every token, used for the case insensitive comparisons in Block.
+"""
+
+import numpy as np
+
+
+class Vocabulary:
+
+    def __init__(self):
+        self.token_ids = {}
+        self.tokens = []
+        self._lower_ids = None
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def _intern(self, token):
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.token_ids[token] = token_id
+            self.tokens.append(token)
+            self._lower_ids = None
+        return token_id
+
+    '''Converts a list of tokens into an int32 array of ids, adding any new tokens to the vocabulary'''
+    def encode(self, tokens):
+        return np.fromiter((self._intern(token) for token in tokens), dtype = np.int32, count = len(tokens))
+
+    '''Converts an array (or list) of ids back into a list of tokens'''
+    def decode(self, ids):
+        return [self.tokens[i] for i in ids.tolist()] if isinstance(ids, np.ndarray) else [self.tokens[i] for i in ids]
+
+    '''Array mapping each token id to the id of its lowercased token. Built once the first time it's
+        needed (and again only if new tokens were added since)'''
+    @property
+    def lower_ids(self):
+        if self._lower_ids is None or len(self._lower_ids) != len(self.tokens):
+            i = 0
+            lower_ids = []
+            #Lowercased tokens can be new tokens themselves, so go until we've covered those as well
+            while i < len(self.tokens):
+                lower_ids.append(self._intern(self.tokens[i].lower()))
+                i += 1
+            self._lower_ids = np.array(lower_ids, dtype = np.int32)
+        return self._lower_ids
+
+    def lower(self, ids):
+        return self.lower_ids[ids]
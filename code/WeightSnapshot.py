@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+An in-memory copy of a model's base weights, restored in place before each cluster's fine tune, so
+every cluster can start from the base model without reloading it from disk.
+
+    snapshot = WeightSnapshot(model)
+    for cluster in clusters:
+        snapshot.restore()
+        ... fine tune model on cluster ...
+
+restore() copies the snapshot back into the model's existing parameter and buffer tensors (no new
+allocations, and anything holding references to them--e.g. an optimizer--stays valid), and
+reset_optimizer zeroes an optimizer's state in place, so one optimizer can be reused across clusters
+too. With share_memory = True the snapshot lives in shared memory, so worker processes can restore from
+the same copy rather than each holding their own. Tensors the model ties together (e.g. GPT-2's input
+embedding and LM head) are only kept and copied once.
+"""
+
+import torch
+
+
+class WeightSnapshot:
+
+    def __init__(self, model, share_memory = False):
+        self.model = model
+        self.state = {}
+        seen = set()
+        for name, tensor in model.state_dict().items():
+            if tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                self.state[name] = tensor.detach().clone()
+        if share_memory:
+            for tensor in self.state.values():
+                tensor.share_memory_()
+
+    '''Copies the snapshot back into the model, in place'''
+    def restore(self):
+        with torch.no_grad():
+            for name, tensor in self.model.state_dict().items():
+                if name in self.state:
+                    tensor.copy_(self.state[name])
+
+
+'''Zeroes an optimizer's state (step counts, moment estimates, ...) in place, as if it were new, keeping its
+    tensors (and its param groups, learning rate included)'''
+def reset_optimizer(optimizer):
+    for state in optimizer.state.values():
+        for key, value in state.items():
+            if torch.is_tensor(value):
+                value.zero_()
+            else:
+                state[key] = type(value)(0)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+A wire cluster file, parsed once and sanitized once per variant, shared by the rule based merging
+(WireFileCombiner) and the GPT training data (create_wire_cluster_training_data).
+
+Only the sanitized variants asked for are kept (see text_sanitizer for the variants), not the raw
+article text, and each is sanitized as its cluster is read. article_sets(variant) and
+training_frame(cluster_ids) hand out views of those same strings, so the rule based path and the GPT
+path no longer each hold their own copy of every article.
+"""
+
+from text_sanitizer import sanitize_all
+from wire_cluster_reader import iter_wire_clusters
+
+MAX_GPT_LEN = 1024 #How many words of an article go into the GPT training data?
+
+
+class WireCorpus:
+
+    def __init__(self, filepath, variants = ('aligning', 'gpt_training')):
+        self.filepath = filepath
+        self.variants = tuple(variants)
+        self.article_ids = {}
+        self.texts = {variant: {} for variant in self.variants}
+
+        for cluster_id, articles in iter_wire_clusters(filepath):
+            raw_texts = [articles[article_id] for article_id in articles.keys()]
+            self.article_ids[cluster_id] = list(articles.keys())
+            for variant in self.variants:
+                self.texts[variant][cluster_id] = sanitize_all(raw_texts, variant)
+
+    def __len__(self):
+        return len(self.article_ids)
+
+    def __contains__(self, cluster_id):
+        return cluster_id in self.article_ids
+
+    def cluster_ids(self):
+        return list(self.article_ids.keys())
+
+    def _variant_texts(self, variant):
+        if variant not in self.texts:
+            raise ValueError('Corpus was not sanitized for {} (only {})'.format(variant, ', '.join(self.variants)))
+        return self.texts[variant]
+
+    '''Dict of cluster id -> list of that cluster's article texts, sanitized with the given variant. This is the
+        corpus' own dict, not a copy'''
+    def article_sets(self, variant = 'aligning'):
+        return self._variant_texts(variant)
+
+    '''The cluster's article texts, sanitized with the given variant'''
+    def cluster(self, cluster_id, variant = 'aligning'):
+        return self._variant_texts(variant)[cluster_id]
+
+    '''GPT training data: a pandas DataFrame with columns cluster_id, article_id and text, where text is the
+        gpt_training sanitized text truncated to MAX_GPT_LEN words. Covers the given clusters (in that order), or
+        the whole corpus. pandas is only imported here, as the rule based path never needs it'''
+    def training_frame(self, cluster_ids = None):
+        import pandas as pd
+        texts = self._variant_texts('gpt_training')
+        if cluster_ids is None:
+            cluster_ids = self.article_ids.keys()
+
+        df_rows = []
+        for cluster_id in cluster_ids:
+            for article_id, text in zip(self.article_ids[cluster_id], texts[cluster_id]):
+                if text.count(' ') > MAX_GPT_LEN:
+                    text = ' '.join(text.split()[:MAX_GPT_LEN])
+
+                df_rows.append( ( cluster_id, article_id, text ) )
+
+        return pd.DataFrame(df_rows, columns = ['cluster_id', 'article_id', 'text'])
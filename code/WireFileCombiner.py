@@ -24,15 +24,17 @@ And call the merge_texts method to synthesize (approximately) the underlying tex
 import json
 import os
 import sys
-import re
-import numpy as np
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from tqdm import tqdm
-from transformers import AutoModelForCausalLM, AutoTokenizer
 sys.path.append(os.path.dirname(__file__))
-from WireNgramCombiner import NgramCombiner
-from GptFineTuner import GptFineTuner
-from WireNeuralCombiner import WireNeuralCombiner
-from create_wire_cluster_training_data import create_wire_cluster_gpt_training
+from WireNgramCombiner import NgramCombiner, MIN_GRAM_LEN
+from OverlapCache import OverlapCache
+from wire_cluster_reader import iter_wire_clusters
+from ResultWriter import read_results
+from text_sanitizer import sanitize, sanitize_all
+from WireCorpus import WireCorpus
+from GenerationScheduler import GenerationScheduler, MAX_BATCH_TOKENS
 
 MIN_BLOCK_COVERAGE = .9
 
@@ -46,19 +48,43 @@ Typical usage is:
     combiner.merge_texts()
     combiner.neural_completions()
     combiner.output_all(<filepath_to_output>)
+
+or, to write each cluster out as soon as it's merged (and resume a crashed run where it stopped):
+    with ResultWriter(<filepath_to_output.jsonl>) as writer:
+        combiner.merge_texts(writer = writer)
 '''
 class WireFileCombiner:
 
-    '''See above for description of the class. See below for format for the input filepath'''
-    def __init__(self, filepath = r'C:\Users\bryan\Documents\NBER\wire_clusters\data\predicted_clusters_May-10-1949.json'):
-
+    '''See above for description of the class. See below for format for the input filepath.
+        overlap_method is passed through to NgramCombiner (either 'pairwise' or 'ngram_index'), as is
+        overlap_workers (the number of processes used to find the overlaps of very large clusters).
+        With an overlap_cache_path, pairwise overlaps are cached on disk there (see OverlapCache), and each
+        cluster's results say how many of its lookups hit the cache (results['overlap_cache']).
+        coverage_target is passed through to NgramCombiner too: with one (MIN_BLOCK_COVERAGE is the usual
+        choice) each cluster stops being merged once its leading block covers that much of the cluster.
+
+        With lazy = True the file isn't loaded up front: merge_texts reads (and sanitizes) one cluster
+        at a time as it goes, so memory use doesn't grow with the size of the file'''
+    def __init__(self, filepath = r'C:\Users\bryan\Documents\NBER\wire_clusters\data\predicted_clusters_May-10-1949.json',
+                 overlap_method = 'pairwise', overlap_workers = 1, lazy = False, overlap_cache_path = None,
+                 coverage_target = None):
+
+        self.filepath = filepath
+        self.lazy = lazy
+        self.corpus = None
         self.article_sets = {}
         self.merged_texts = {}
+        self.merge_errors = {}
+        self.overlap_method = overlap_method
+        self.overlap_workers = overlap_workers
+        self.overlap_cache_path = overlap_cache_path
+        self.coverage_target = coverage_target
 
-        if filepath is not None:
+        if filepath is not None and not lazy:
             self._load_file(filepath)
 
-        self.training_format_data = create_wire_cluster_gpt_training(filepath)
+        self._training_format_data = None
+        self._training_corpus = None
         self.model = None
         self.tokenizer = None
         self.test_prompt = 'Hello, I am trying to get information about a boy who fell out of a tree.'
@@ -75,13 +101,36 @@ class WireFileCombiner:
                 ...
             },
             ...
-        }'''
-    def _load_file(self, filepath):
-        with open(filepath, 'r') as infile:
-            wire_articles = json.load(infile)
+        }
 
-        for k, article in wire_articles.items():
-            self.article_sets[k] = [self.sanitize_before_aligning(article[i]) for i in article.keys()]
+        The file is parsed into a WireCorpus only sanitized for aligning (article_sets): the GPT training data
+        is sanitized separately, the first time it's needed (see training_corpus)'''
+    def _load_file(self, filepath):
+        self.corpus = WireCorpus(filepath, variants = ('aligning',))
+        self.article_sets = self.corpus.article_sets('aligning')
+
+    '''Reads the clusters in the input json one at a time, yielding (cluster id, sanitized articles) for those
+        in ids (all of them if ids is None) and not in skip'''
+    def _read_article_sets(self, filepath, ids = None, skip = ()):
+        for k, article in iter_wire_clusters(filepath):
+            if (ids is None or k in ids) and k not in skip:
+                yield k, sanitize_all([article[i] for i in article.keys()], 'aligning')
+
+    '''Corpus the GPT training data comes from: in either mode, one only sanitized for GPT training that's read
+        the first time training data is needed, so the rule based path never pays for it'''
+    @property
+    def training_corpus(self):
+        if self._training_corpus is None:
+            self._training_corpus = WireCorpus(self.filepath, variants = ('gpt_training',))
+        return self._training_corpus
+
+    '''GPT training format version of the input file (see create_wire_cluster_training_data), only built
+        once something needs it'''
+    @property
+    def training_format_data(self):
+        if self._training_format_data is None:
+            self._training_format_data = self.training_corpus.training_frame()
+        return self._training_format_data
 
     '''Performs some minor article cleaning needed to better combine the articles.
     In particular, converts any whitespace chunk into a single space and removes any characters
@@ -100,32 +149,24 @@ class WireFileCombiner:
             Same text, with normalized whitespace (any whitespace replaced with a single space)
 
         """
-        pattern = re.compile('[^A-Za-z0-9\s!#\$%&\*\(\)_\?\/\+-=\[\]:;\'",\.]\+\u2014')
-        text = pattern.sub('', text)
-
-        text = re.sub('\u2014', '--', text) #em dash replaced with spaces--seem to often be equivalent in transcriptions
-        text = re.sub('[\u201c\u201d\u2018]', '"', text)
-        text = re.sub('\u2019', '\'', text)
-        text = re.sub(' \. ', ' \.', text)
-        text = re.sub(' , ', ', ', text)
-        text = re.sub(' \' ', '\'', text)
-        text = re.sub('\|', '', text)
-        text = re.sub('\"', '\'', text)
-        text = re.sub('\s+', ' ', text) #Any length whitespace replace with a single space
-        text = re.sub('- ', '', text) #Hyphen-spaces (almost always a word split between two lines) deleted
-        text = re.sub(r'(\.)([^ ])', r'\1 \2', text) #Replaces period-<not a space> with period-space-<not a space>
-        return re.sub(r'[^A-Za-z0-9\.\-,\s+]', '', text).strip()
+        return sanitize(text, 'aligning')
 
     '''
     Estimates the underlying text for each article saved in the articles sets
     attribute. Typically this will be each wire cluster in a json that's been
     loaded
 
-    If a list of
+    If a list of ids (or a single id) is passed in, only those clusters get merged, otherwise every
+    cluster does. With n_workers > 1 the clusters are spread over a process pool. Either way results
+    land in merged_texts in the same (cluster) order, and a cluster that fails doesn't stop the run--
+    its traceback goes into merge_errors instead
+
+    In lazy mode clusters are read from the file as they're merged, and results land in file order
 
-    TODO: Take out the [:20] block (just for testing to make calls shorter)
+    If a ResultWriter is passed in, each cluster's results are written out as soon as they're done rather
+    than kept in merged_texts, and clusters the writer already has (from an earlier run) are skipped
     '''
-    def merge_texts(self, ids = None):
+    def merge_texts(self, ids = None, n_workers = 1, writer = None):
         print('Creating Blocks!')
 
         if ids:
@@ -133,33 +174,135 @@ class WireFileCombiner:
                 ids = [str(ids)]
             elif type(ids) == str:
                 ids = [ids]
+        elif not self.lazy:
+            ids = list(self.article_sets.keys())
 
-            for k in ids:
-                self.merged_texts[k] = self._merge_set(k)
+        skip = writer.done_ids if writer is not None else set()
+
+        if self.lazy:
+            self._merge_stream(set(ids) if ids else None, n_workers, writer)
+            return
+
+        ids = [k for k in ids if k not in skip]
+        if n_workers > 1:
+            results = self._merge_parallel(ids, n_workers, writer)
         else:
-            for k in tqdm(list(self.article_sets.keys())[:20]):
-                self.merged_texts[k] = self._merge_set(k)
+            results = {}
+            for k in tqdm(ids):
+                self._store_result(k, self._merge_set(k), results, writer)
+
+        for k in ids:
+            if k in results:
+                self.merged_texts[k] = results[k]
+
+    '''
+    Runs _merge_set for the given clusters over a pool of n_workers processes. Biggest clusters get
+    submitted first so one big cluster doesn't end up starting last and holding up the whole file.
+    Returns a dict of the results for all clusters that merged successfully (unless they went to a writer)
+    '''
+    def _merge_parallel(self, ids, n_workers, writer = None):
+        results = {}
+
+        with ProcessPoolExecutor(max_workers = n_workers) as executor:
+            futures = {}
+            for k in sorted(ids, key = lambda x: len(self.article_sets[x]), reverse = True):
+                futures[executor.submit(merge_article_set, self.article_sets[k], self.overlap_method,
+                                        self.overlap_workers, self.overlap_cache_path, self.coverage_target)] = k
+
+            for future in tqdm(as_completed(futures), total = len(futures)):
+                self._collect_result(future, futures[future], results, writer)
+
+        return results
+
+    def _collect_result(self, future, k, results, writer = None):
+        try:
+            result = future.result()
+        except Exception:
+            self.merge_errors[k] = traceback.format_exc()
+            return
+        self._store_result(k, result, results, writer)
+
+    '''Sends a finished cluster's results to the writer if there is one, otherwise into results. Failed
+        clusters (None) are dropped'''
+    def _store_result(self, k, result, results, writer = None):
+        if result is None:
+            return
+        if writer is not None:
+            writer.write(k, result)
+        else:
+            results[k] = result
+
+    '''
+    Lazy mode version of merge_texts: reads the clusters one at a time, merging each as it's read. With
+    n_workers > 1, only up to 2 * n_workers clusters are read ahead of the pool at any time
+    '''
+    def _merge_stream(self, ids, n_workers, writer = None):
+        order = []
+        results = {}
+        skip = writer.done_ids if writer is not None else set()
+        clusters = self._read_article_sets(self.filepath, ids, skip)
+
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers = n_workers) as executor:
+                futures = {}
+                for k, article_set in tqdm(clusters):
+                    order.append(k)
+                    futures[executor.submit(merge_article_set, article_set, self.overlap_method,
+                                            self.overlap_workers, self.overlap_cache_path, self.coverage_target)] = k
+                    if len(futures) >= 2 * n_workers:
+                        done, _ = wait(futures, return_when = FIRST_COMPLETED)
+                        for future in done:
+                            self._collect_result(future, futures.pop(future), results, writer)
+
+                for future in as_completed(futures):
+                    self._collect_result(future, futures[future], results, writer)
+        else:
+            for k, article_set in tqdm(clusters):
+                order.append(k)
+                self._store_result(k, self._merge_set(k, article_set), results, writer)
+
+        for k in order:
+            if k in results:
+                self.merged_texts[k] = results[k]
 
     '''
     Estimate the underlying text for some particular wire cluster article. Really just
     a wrapper for using the NgramCombiner class, which takes in a set of articles
-    and outputs their synthesized text
+    and outputs their synthesized text. Returns None (and records the error) if the
+    cluster can't be merged. The articles are looked up in article_sets unless passed in
     '''
-    def _merge_set(self, k):
-        article_set = self.article_sets[k]
-        combiner = NgramCombiner(article_set)
-        return combiner.estimate_text()
+    def _merge_set(self, k, article_set = None):
+        try:
+            if article_set is None:
+                article_set = self.article_sets[k]
+            return merge_article_set(article_set, self.overlap_method, self.overlap_workers, self.overlap_cache_path,
+                                     self.coverage_target)
+        except Exception:
+            self.merge_errors[k] = traceback.format_exc()
+            return None
 
 
     '''
     Loads in output from directly after the merge_texts step, allowing the rule-based merging and the
-    neuarl completion to be run and tested separately
+    neuarl completion to be run and tested separately. Takes either a json written by output_all
+    or a .jsonl written by a ResultWriter. Covers the clusters in the input file (in lazy mode, read
+    from it one at a time), or without one, those in the merge data
     '''
     def load_merges(self, merge_path):
-        with open(merge_path, 'r') as infile:
-            merge_data = json.load(infile)
+        if merge_path.endswith('.jsonl'):
+            merge_data = read_results(merge_path)
+        else:
+            with open(merge_path, 'r') as infile:
+                merge_data = json.load(infile)
 
-        for k in self.article_sets.keys():
+        if self.filepath is None:
+            ids = merge_data.keys()
+        elif self.lazy:
+            ids = (k for k, _ in iter_wire_clusters(self.filepath))
+        else:
+            ids = self.article_sets.keys()
+
+        for k in ids:
             try:
                 self.merged_texts[k] = merge_data[k]
             except KeyError:
@@ -173,26 +316,142 @@ class WireFileCombiner:
 
     This wrapper is mostly just responsible for initializing the model and tokenizer,
     while the private function does the actual work.
+
+    transformers (and torch, through GptFineTuner) only get imported here, so runs that only do the
+    rule-based merging--and every pool worker--don't pay for loading them
+
+    batch_size and accumulation_steps are passed on to GptFineTuner.fine_tune. By default each cluster
+    fine tunes the whole model, carrying on from the previous cluster's weights. With an adapter_mode
+    (see ClusterAdapter) the base model is frozen instead and each cluster trains just that subset of it,
+    starting from the base weights every time; with an adapter_cache_dir too, the trained deltas are
+    cached there, so clusters seen on an earlier run aren't trained again. Without an adapter, restore_base
+    gives every cluster an independent fine tune of the base model too: the base weights are snapshotted
+    in memory once and restored in place before each cluster (see WeightSnapshot), rather than reloading
+    the model, and the one optimizer is reset and reused.
+
+    With a tokenized_path, the whole file's training data is tokenized once into a memory-mapped
+    TokenizedCorpus there (or the one already there is reused, if it was made from the same text with the
+    same tokenizer) and each cluster's fine tune reads its tokens straight from it.
+
+    Each cluster's gaps are generated right after its fine tune, in batches of up to generation_batch_tokens
+    tokens (see GenerationScheduler). With batch_across_clusters = True (only for cumulative fine tuning,
+    i.e. without an adapter_mode or restore_base) all clusters are fine tuned first and then the gaps of
+    every cluster are generated together, so the batches fill up across clusters. Note this changes the
+    output: every cluster's gaps are then generated by the model fine tuned on all the clusters, rather
+    than on the clusters up to and including its own
     '''
-    def neural_completions(self, huggingface_model = 'sshleifer/tiny-gpt2'):
+    def neural_completions(self, huggingface_model = 'sshleifer/tiny-gpt2', batch_size = None, accumulation_steps = 1,
+                           adapter_mode = None, adapter_cache_dir = None, restore_base = False, tokenized_path = None,
+                           generation_batch_tokens = MAX_BATCH_TOKENS, batch_across_clusters = False):
+        if batch_across_clusters and (adapter_mode is not None or restore_base):
+            raise ValueError('batch_across_clusters needs cumulative fine tuning (no adapter_mode or restore_base)')
+
+        from transformers import AutoModelForCausalLM, AutoTokenizer
         print('GPT-2 Polishing!')
 
         self.model = AutoModelForCausalLM.from_pretrained(huggingface_model)
         self.tokenizer = AutoTokenizer.from_pretrained(huggingface_model)
-
-        for k in tqdm(list(self.merged_texts.keys())):
-            self.merged_texts[k]['text'] = self._neural_completion(k)
-
-    '''Private method that does the heavy lifting of neural combination/estimation'''
-    def _neural_completion(self, k):
-        merge_results = self.merged_texts[k]
-
-        cluster_training = self.training_format_data[self.training_format_data['cluster_id'] == k]
-        finetuner = GptFineTuner(self.model, self.tokenizer, cluster_training)
-        self.model = finetuner.fine_tune()
-
-        combiner = WireNeuralCombiner(self.model, self.tokenizer, merge_results)
-        self.merged_texts[k]['n_text'] = combiner.estimate_text()
+        self.model_name = huggingface_model
+        self.fine_tune_args = {'batch_size': batch_size, 'accumulation_steps': accumulation_steps}
+
+        self.tokenized = self._open_tokenized(tokenized_path) if tokenized_path is not None else None
+        self.adapter = None
+        self.adapter_cache = None
+        self.snapshot = None
+        self.optimizer = None
+        if restore_base and adapter_mode is None:
+            from WeightSnapshot import WeightSnapshot
+            self.snapshot = WeightSnapshot(self.model)
+        if adapter_mode is not None:
+            from ClusterAdapter import ClusterAdapter, AdapterCache
+            self.adapter = ClusterAdapter(self.model, adapter_mode)
+            if adapter_cache_dir is not None:
+                self.adapter_cache = AdapterCache(adapter_cache_dir)
+
+        self.generation_batch_tokens = generation_batch_tokens
+
+        ids = list(self.merged_texts.keys())
+        for k in tqdm(ids):
+            self._fine_tune_cluster(k)
+            if not batch_across_clusters:
+                self._complete_clusters([k])
+        if batch_across_clusters:
+            self._complete_clusters(ids)
+
+    '''Private method that does the heavy lifting of neural combination/estimation: fine tunes the model
+        on cluster k (or sets its adapter)'''
+    def _fine_tune_cluster(self, k):
+        from GptFineTuner import GptFineTuner, WireSet
+
+        cluster_training = self.training_corpus.training_frame([k])
+        training_data = cluster_training
+        if self.tokenized is not None:
+            training_data = WireSet.from_tokenized(self.tokenized, k, self.tokenizer)
+
+        if self.adapter is None:
+            if self.snapshot is not None:
+                self._restore_base()
+            finetuner = GptFineTuner(self.model, self.tokenizer, training_data)
+            self.model = finetuner.fine_tune(optimizer = self.optimizer, **self.fine_tune_args)
+            if self.snapshot is not None:
+                self.optimizer = finetuner.optimizer
+        else:
+            self._fit_adapter(k, cluster_training, training_data)
+
+    '''Fills the gaps between the blocks of the given clusters with the current model, generating all of
+        their gaps together, and stores the results as merged_texts[k]['n_text']'''
+    def _complete_clusters(self, ids):
+        from WireNeuralCombiner import WireNeuralCombiner
+        scheduler = GenerationScheduler(self.model, self.tokenizer, max_batch_tokens = self.generation_batch_tokens)
+
+        combiners = {}
+        for k in ids:
+            combiners[k] = WireNeuralCombiner(self.model, self.tokenizer, self.merged_texts[k], cluster_id = k)
+            for gap, prompt in enumerate(combiners[k].gap_prompts()):
+                scheduler.add((k, gap), prompt)
+
+        outputs = scheduler.run()
+        for k, combiner in combiners.items():
+            self.merged_texts[k]['n_text'] = combiner.assemble([outputs[(k, gap)] for gap in range(combiner.n_gaps)])
+
+    '''Opens the TokenizedCorpus at path, building it first if it's missing, or was made with another tokenizer or
+        from other text (e.g. another day's file with some of the same cluster ids)'''
+    def _open_tokenized(self, path):
+        from TokenizedCorpus import TokenizedCorpus
+        training_frame = self.training_corpus.training_frame()
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            tokenized = TokenizedCorpus(path)
+            if tokenized.matches(training_frame, self.tokenizer):
+                return tokenized
+
+        TokenizedCorpus.build(path, training_frame, self.tokenizer)
+        return TokenizedCorpus(path)
+
+    '''Puts the model back to its base weights, and the optimizer (once there is one) back to a fresh state'''
+    def _restore_base(self):
+        from WeightSnapshot import reset_optimizer
+        self.snapshot.restore()
+        if self.optimizer is not None:
+            reset_optimizer(self.optimizer)
+
+    '''Sets the adapter's parameters for cluster k: from the cache if they're there, otherwise by fine tuning
+        them from the base weights (and caching the result)'''
+    def _fit_adapter(self, k, cluster_training, training_data):
+        from GptFineTuner import GptFineTuner
+
+        key = None
+        if self.adapter_cache is not None:
+            key = self.adapter_cache.key(self.model_name, k, list(cluster_training['text']),
+                                         dict(self.fine_tune_args, adapter_mode = self.adapter.mode))
+            delta = self.adapter_cache.get(key)
+            if delta is not None:
+                self.adapter.apply(delta)
+                return
+
+        self.adapter.reset()
+        GptFineTuner(self.model, self.tokenizer, training_data).fine_tune(**self.fine_tune_args)
+        if key is not None:
+            self.adapter_cache.put(key, self.adapter.delta())
 
     '''Outputs merged/synthesized clusters as a json to a given filepath'''
     def output_all(self, outpath):
@@ -200,6 +459,27 @@ class WireFileCombiner:
             json.dump(self.merged_texts, outfile, indent = 4)
 
 
+'''
+Synthesizes the text of a single cluster's articles. Lives at the module level (rather than as
+a WireFileCombiner method) so it can be sent to pool workers. Each call opens its own connection
+to the overlap cache, if there is one, and reports that cluster's cache lookups in the results as
+results['overlap_cache'] = {'hits': ..., 'misses': ...}
+'''
+def merge_article_set(article_set, overlap_method = 'pairwise', overlap_workers = 1, overlap_cache_path = None,
+                      coverage_target = None):
+    if overlap_cache_path is None:
+        combiner = NgramCombiner(article_set, overlap_method = overlap_method, n_workers = overlap_workers,
+                                 coverage_target = coverage_target)
+        return combiner.estimate_text()
+
+    with OverlapCache(overlap_cache_path, MIN_GRAM_LEN) as overlap_cache:
+        combiner = NgramCombiner(article_set, overlap_method = overlap_method, n_workers = overlap_workers,
+                                 overlap_cache = overlap_cache, coverage_target = coverage_target)
+        results = combiner.estimate_text()
+        results['overlap_cache'] = {'hits': overlap_cache.hits, 'misses': overlap_cache.misses}
+        return results
+
+
 '''
 For testing/debugging. Change the filepath to use a different wire cluster json or
 the key accessing article_sets to use a different cluster.
@@ -11,20 +11,50 @@ Wire Neural Combiner -- process for taking:
     - Metadata from all of the above
 
 And creating a final guess at the underlying text of that wire article.
+
+The blocks are put in order of coverage (highest first), and the model writes a bridge across each gap
+between consecutive blocks, prompted with the cluster's tag and the end of the block before the gap.
+The prompts can be queued on a shared GenerationScheduler (gap_prompts/assemble), so the gaps of many
+clusters get generated in the same batches.
 """
 
+from GenerationScheduler import GenerationScheduler
+
+PROMPT_WORDS = 50 #How many words from the end of a block go into the prompt for the gap after it?
+
 class WireNeuralCombiner:
 
-    def __init__(self, model, tokenizer, merge_results):
+    def __init__(self, model, tokenizer, merge_results, cluster_id = None):
 
         self.model = model
         self.tokenizer = tokenizer
-        self.merge_result = merge_results
-        self.blocks = None
-
+        self.merge_results = merge_results
+        self.cluster_id = cluster_id
+        #Clusters without merge data (see WireFileCombiner.load_merges) have no blocks, and no gaps
+        self.blocks = [block for _, block in sorted(zip(self.merge_results.get('block_coverages', []), self.merge_results.get('blocks', [])),
+                                                    key = lambda x: x[0], reverse = True)]
+
+    @property
+    def n_gaps(self):
+        return max(len(self.blocks) - 1, 0)
+
+    '''One prompt per gap between consecutive blocks'''
+    def gap_prompts(self):
+        tag = '<|{}|>'.format(self.cluster_id) if self.cluster_id is not None else ''
+        return [tag + ' '.join(block.split()[-PROMPT_WORDS:]) for block in self.blocks[:-1]]
+
+    '''The blocks joined up by the text generated for each gap'''
+    def assemble(self, completions):
+        pieces = self.blocks[:1]
+        for completion, block in zip(completions, self.blocks[1:]):
+            pieces.extend([completion.strip(), block])
+        return ' '.join(piece for piece in pieces if piece)
+
+    '''Generates this cluster's gaps on its own and returns the assembled text'''
     def estimate_text(self):
-        self.blocks = sorted(zip(self.merge_results['block_coverages'], self.merge_results['blocks']),
-                                    key = lambda x: x[0])
+        scheduler = GenerationScheduler(self.model, self.tokenizer)
+        for gap, prompt in enumerate(self.gap_prompts()):
+            scheduler.add(gap, prompt)
 
-        for block in blocks:
-            pass
\ No newline at end of file
+        outputs = scheduler.run()
+        return self.assemble([outputs[gap] for gap in range(self.n_gaps)])
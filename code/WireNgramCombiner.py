@@ -22,38 +22,77 @@ A larger description can be found at <confluence link>
 """
 
 import re
+import heapq
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from difflib import SequenceMatcher as sm
 import time
 from tqdm import tqdm
-from Block import Block
+from Block import Block, MIN_OVERLAP_GRAM_LEN
+from NgramIndex import NgramIndex
+from SourceOverlapIndex import SourceOverlapIndex
+from Vocabulary import Vocabulary
+from CombinerStats import CombinerStats, NULL_STATS
 import numpy as np
 
 '''Constants'''
 MIN_GRAM_LEN = 6 #What is the smallest N-gram that will be considered?
 MIN_TOKEN_DIST_MERGE_ATTEMPT = 10 #At what distance will we attempt to merge blocks? (may be successful or not)
+PARALLEL_OVERLAP_MIN_ARTICLES = 40 #How many articles must a cluster have before its pairwise overlaps are split across workers?
 
 
 '''The main class-- see description above. '''
 class NgramCombiner:
 
     '''The constructor just takes in the set of articles, which should
-        just be a list of texts
+        just be a list of texts. overlap_method is either 'pairwise' or 'ngram_index', see _find_overlaps.
+        With n_workers > 1, clusters of at least parallel_threshold articles have their pairwise
+        overlaps found over a pool of n_workers processes. overlap_cache is an optional OverlapCache the
+        pairwise overlaps are looked up in (and added to) before aligning any articles.
+
+        With a coverage_target (e.g. .9), estimate_text stops starting new blocks as soon as the leading
+        block (blocks[0]) covers at least that share of the cluster's text (see estimate_block_coverage),
+        rather than carrying on until no unused overlap is left, and says so in results_dict['stopped_early']
+
+        With stats = True (or a stats_hook) estimate_text records the wall time of each of its phases and
+        counts of the work done (see CombinerStats), returns them as results_dict['stats'] and passes them
+        to stats_hook, if given
+
+        Articles are split into words and interned into the cluster's Vocabulary, so from here on
+        every article (and all Block/Chunk text) is an int32 array of token ids
     '''
-    def __init__(self, article_set, log_file = None, debug_mode = False):
+    def __init__(self, article_set, log_file = None, debug_mode = False, overlap_method = 'pairwise',
+                 n_workers = 1, parallel_threshold = PARALLEL_OVERLAP_MIN_ARTICLES, overlap_cache = None,
+                 stats = False, stats_hook = None, coverage_target = None):
+        self.log_file = None #Set before validating, so __del__ still works if the arguments are bad
         if log_file is None and debug_mode:
             raise ValueError('Must provide a log file path to use debug mode!')
+        if overlap_method not in ('pairwise', 'ngram_index'):
+            raise ValueError('Unknown overlap method {}! Must be pairwise or ngram_index'.format(overlap_method))
+        if coverage_target is not None and not 0 < coverage_target <= 1:
+            raise ValueError('Coverage target must be in (0, 1], not {}'.format(coverage_target))
         self.article_set = sorted(article_set, key = len, reverse = True)
-        self.article_set = [article.split() for article in self.article_set]
+        self.vocab = Vocabulary()
+        self.article_set = [self.vocab.encode(article.split()) for article in self.article_set]
+        self.vocab.lower_ids #Builds the lowercased ids now, while every token in the cluster is known
         self.avg_art_len = sum([len(a) for a in self.article_set]) / len(self.article_set)
         self.total_art_len = sum([len(a) for a in self.article_set])
         self.overlap_dict = None
         self.blocks = []
+        self.block_signatures = {}
+        self.pending_merges = set()
         if log_file:
             self.log_file = open(log_file, 'w')
-        else:
-            self.log_file = None
         self.debug_mode = debug_mode
+        self.overlap_method = overlap_method
+        self.n_workers = n_workers
+        self.parallel_threshold = parallel_threshold
+        self.overlap_cache = overlap_cache
+        self.stats = CombinerStats() if stats or stats_hook else NULL_STATS
+        self.stats_hook = stats_hook
+        self.coverage_target = coverage_target
+        self.leading_block = None
 
     def __del__(self):
         if self.log_file:
@@ -70,52 +109,44 @@ class NgramCombiner:
 
         '''Finds all the pairwise overlaps between articles, and the longest one
         to be the starting block'''
-        self.overlap_dict, starting_block = self._find_overlaps()
+        with self.stats.phase('find_overlaps'):
+            self.overlap_dict, starting_block = self._find_overlaps()
 
         '''Builds out the starting block, merging in other overlapping article segments
         that share text with the starting block'''
-        starting_block = self._build_out_block(starting_block)
-        self.blocks.append(starting_block)
+        with self.stats.phase('build_out_block'):
+            starting_block = self._build_out_block(starting_block)
+        self._add_block(starting_block)
+        self.stats.count('blocks_created')
 
         '''Iterate through all unused overlaps, trying to create more blocks,
         expand those blocks, and finally merge the blocks into larger chunks to
         create a full reconsitiution of the article'''
-        new_block_started = True
+        with self.stats.phase('coverage'):
+            self._build_overlap_heap()
+            stopped_early = self._reached_coverage_target()
+        new_block_started = not stopped_early
         while new_block_started:
 
-            block_dicts = [block.get_source_min_max() for block in self.blocks]
-            articles_coverage = []
-
-            for i in range(len(self.article_set)):
-                art_coverage = [0]
-                for k, d in enumerate(block_dicts):
-                    if i in self.blocks[k].sources:
-                        art_coverage.extend([d[i]['min_idx'], d[i]['max_idx']])
-
-                art_coverage.append(len(self.article_set[i]))
-                articles_coverage.append(art_coverage)
-
-            max_len = 0
-            longest_unused_overlap = None
-            longest_text = None
-
-            for i in range(len(self.article_set)):
-                for k in range(int(len(articles_coverage[i]) / 2)):
-                    low_bound, high_bound = articles_coverage[i][2 * k], articles_coverage[i][2 * k + 1]
-                    for overlap in self.overlap_dict[i]:
-                        if overlap[0] > low_bound and overlap[0] + overlap[1] < high_bound:
-                            if overlap[1] > max_len:
-                                max_len = overlap[1]
-                                longest_unused_overlap = (i, overlap[0], overlap[2], overlap[3], overlap[1])
-                                longest_text = self.article_set[i][overlap[0]:overlap[0] + overlap[1]]
+            with self.stats.phase('coverage'):
+                longest_unused_overlap = self._pop_longest_unused_overlap()
 
             if longest_unused_overlap:
-                self.overlap_dict[longest_unused_overlap[0]].remove((longest_unused_overlap[1], longest_unused_overlap[4],
-                                                                     longest_unused_overlap[2], longest_unused_overlap[3]))
-                new_block = self._build_out_block(Block(*longest_unused_overlap, longest_text))
-                self.blocks.append(new_block)
-
-                self._merge_blocks()
+                i, overlap = longest_unused_overlap
+                self.overlap_dict[i].remove(overlap)
+                longest_text = self.get_article_text(i, overlap[0], overlap[1])
+                with self.stats.phase('build_out_block'):
+                    new_block = self._build_out_block(Block(i, overlap[0], overlap[2], overlap[3], overlap[1], longest_text,
+                                                            vocab = self.vocab, stats = self.stats))
+                with self.stats.phase('merge_blocks'):
+                    self._add_block(new_block)
+                    changed_sources = self._merge_blocks()
+                self.stats.count('blocks_created')
+
+                with self.stats.phase('coverage'):
+                    self._refresh_coverage(new_block.sources | changed_sources)
+                    stopped_early = self._reached_coverage_target()
+                new_block_started = not stopped_early
             else:
                 new_block_started = False
 
@@ -123,7 +154,7 @@ class NgramCombiner:
         #     self._try_fuzzy_merges()
 
         if print_results:
-            print(' '.join(self.blocks[0].merged_text).replace('- ', ''))
+            print(self.get_block_text(self.blocks[0]).replace('- ', ''))
             print('n_remaining_blocks: {}'.format(len(self.blocks)))
             print('N_articles: {}'.format(len(self.article_set)))
             print('Text Length: {}'.format(len(self.blocks[0].merged_text)))
@@ -132,18 +163,27 @@ class NgramCombiner:
         if self.debug_mode:
             self.log_file.write('\n\n Remaining Blocks \n\n')
             for block in self.blocks:
-                self.log_file.write(' '.join(block.merged_text).replace('- ', '') + '\n')
+                self.log_file.write(self.get_block_text(block).replace('- ', '') + '\n')
 
-        block_coverages = [self.estimate_block_coverage(block) for block in self.blocks]
+        with self.stats.phase('results'):
+            block_coverages = [self.estimate_block_coverage(block) for block in self.blocks]
+            block_texts = [self.get_block_text(block) for block in self.blocks]
 
         results_dict = {
                         'n_remaining_blocks': len(self.blocks),
                         'N_articles': len(self.article_set),
                         'text length': len(self.blocks[0].merged_text),
                         'elapsed': time.time() - start_time,
-                        'blocks': [' '.join(block.merged_text) for block in self.blocks],
+                        'blocks': block_texts,
                         'block_coverages': block_coverages
                         }
+
+        if self.coverage_target is not None:
+            results_dict['stopped_early'] = stopped_early
+        if self.stats.enabled:
+            results_dict['stats'] = self.stats.as_dict()
+            if self.stats_hook is not None:
+                self.stats_hook(results_dict['stats'])
         return results_dict
 
     '''Trying to get an estimate for the amount of text the block in question covers.
@@ -164,25 +204,188 @@ class NgramCombiner:
 
         return block_total_len / self.total_art_len
 
+    '''With a coverage_target, has the leading block reached it? Its coverage is only recomputed when a merge
+        has replaced it'''
+    def _reached_coverage_target(self):
+        if self.coverage_target is None or self.blocks[0] is self.leading_block:
+            return False
+        self.leading_block = self.blocks[0]
+        return self.estimate_block_coverage(self.leading_block) >= self.coverage_target
+
+    '''Appends a block, queueing a merge attempt with every current block it could possibly merge with'''
+    def _add_block(self, block):
+        self.blocks.append(block)
+        self._queue_merges(block)
+
+    '''Blocks only merge if they share a run of more than MIN_OVERLAP_GRAM_LEN tokens, so they must share
+        at least one (MIN_OVERLAP_GRAM_LEN + 1)-gram. Pairs of blocks that don't are never worth trying'''
+    def _queue_merges(self, block):
+        signature = merge_signature(block.merged_text)
+        self.block_signatures[block] = signature
+        position = self.blocks.index(block)
+
+        for n, other in enumerate(self.blocks):
+            if other is not block and not signature.isdisjoint(self.block_signatures[other]):
+                self.pending_merges.add((other, block) if n < position else (block, other))
+
+    '''Merges any blocks that can be merged. Returns the set of sources of all the blocks created by merging.
+
+        Only pairs in pending_merges get tried: merge_block is deterministic, so a pair that failed once keeps
+        failing until one of its blocks is replaced by a merge, and then the new block's pairs get queued.
+        Pairs are still tried in the same order the old full scan over (i, j) tried them, including that after
+        a merge the scan carried on from i = 1 rather than 0 (the first block is picked up on the next call)'''
     def _merge_blocks(self):
-        i = 0
-
-        while i < len(self.blocks):
-            for j in range(i + 1, len(self.blocks)):
-
-                merged_block = self.blocks[i].merge_block(self.blocks[j])
+        changed_sources = set()
+        min_i = 0
+
+        while True:
+            positions = {block: n for n, block in enumerate(self.blocks)}
+            candidates = [(positions[a], positions[b], a, b) for a, b in self.pending_merges if positions[a] >= min_i]
+            if not candidates:
+                break
+
+            i, j, block_a, block_b = min(candidates, key = lambda x: (x[0], x[1]))
+            self.pending_merges.discard((block_a, block_b))
+            merged_block = block_a.merge_block(block_b)
+            self.stats.count('merge_attempts')
+
+            if merged_block:
+                self.stats.count('merges')
+                if self.debug_mode:
+                    self.log_file.write('Merging Blocks:\n')
+                    self.log_file.write(self.get_block_text(block_a).replace('- ', '') + '\n')
+                    self.log_file.write(self.get_block_text(block_b).replace('- ', '') + '\n')
+                    self.log_file.write(self.get_block_text(merged_block).replace('- ', '') + '\n')
+                self.blocks[i] = merged_block
+                self.blocks.pop(j)
+
+                for block in (block_a, block_b):
+                    del self.block_signatures[block]
+                self.pending_merges = {pair for pair in self.pending_merges
+                                       if block_a not in pair and block_b not in pair}
+                self._queue_merges(merged_block)
+
+                changed_sources |= merged_block.sources
+                min_i = 1
+
+        return changed_sources
+
+    '''Puts every overlap into a heap, ordered by length (longest first), then source, then position
+        in overlap_dict[source]--the same order a full scan over overlap_dict would find them in'''
+    def _build_overlap_heap(self):
+        self.overlap_heap = []
+        self.stale_overlaps = defaultdict(list)
+        self.stale_starts = defaultdict(list)
+        self.coverage_cache = {}
+
+        for i in range(len(self.article_set)):
+            for seq, overlap in enumerate(self.overlap_dict[i]):
+                self.overlap_heap.append((-overlap[1], i, seq, overlap))
+        heapq.heapify(self.overlap_heap)
+
+    '''Coverage of source i by the current blocks: 0, the min and max index of each block using source i
+        (in block order), then the article length. Overlaps falling strictly between an (even, odd) pair of
+        entries don't overlap any block yet'''
+    def _source_coverage(self, i):
+        coverage = self.coverage_cache.get(i)
+        if coverage is None:
+            coverage = [0]
+            for block in self.blocks:
+                if i in block.sources:
+                    coverage.extend([block.source_min_max[i]['min_idx'], block.source_min_max[i]['max_idx']])
+            coverage.append(len(self.article_set[i]))
+            self.coverage_cache[i] = coverage
+
+        return coverage
+
+    def _first_unused_gap(self, i, overlap):
+        coverage = self._source_coverage(i)
+        for k in range(int(len(coverage) / 2)):
+            if overlap[0] > coverage[2 * k] and overlap[0] + overlap[1] < coverage[2 * k + 1]:
+                return k
+
+        return None
+
+    '''Pops the longest overlap that is still unused and doesn't overlap any current block, returning
+        (source, overlap), or None if there are none left. Overlaps already used by a block are dropped
+        as they come up. Overlaps currently covered by a block are set aside (stale_overlaps) until
+        the coverage of their source changes. Ties are broken just as a scan over overlap_dict would:
+        lowest source, then the first gap in coverage that fits, then position in overlap_dict'''
+    def _pop_longest_unused_overlap(self):
+        while self.overlap_heap:
+            neg_size, i = self.overlap_heap[0][0], self.overlap_heap[0][1]
+
+            candidates = []
+            while self.overlap_heap and self.overlap_heap[0][0] == neg_size and self.overlap_heap[0][1] == i:
+                entry = heapq.heappop(self.overlap_heap)
+                self.stats.count('overlaps_considered')
+                if entry[3] not in self.overlap_dict[i]:
+                    continue
+                k = self._first_unused_gap(i, entry[3])
+                if k is None:
+                    self._set_aside(i, entry)
+                else:
+                    candidates.append((k, entry))
+
+            if candidates:
+                best = min(candidates, key = lambda x: (x[0], x[1][2]))
+                for candidate in candidates:
+                    if candidate is not best:
+                        heapq.heappush(self.overlap_heap, candidate[1])
+                return i, best[1][3]
+
+        return None
+
+    '''Sets aside an overlap covered by the current blocks, keeping each source's set aside overlaps sorted
+        by start index'''
+    def _set_aside(self, i, entry):
+        pos = bisect_right(self.stale_starts[i], entry[3][0])
+        self.stale_starts[i].insert(pos, entry[3][0])
+        self.stale_overlaps[i].insert(pos, entry)
+
+    '''The (start, end) of each gap in a source's coverage (see _source_coverage)'''
+    @staticmethod
+    def _coverage_gaps(coverage):
+        return [(coverage[2 * k], coverage[2 * k + 1]) for k in range(int(len(coverage) / 2))]
+
+    '''Called whenever the blocks covering some sources change--their cached coverage is dropped, and the
+        overlaps set aside for them that fit one of the new gaps in their coverage go back into the heap.
+
+        A set aside overlap didn't fit any gap of the coverage it was last checked against, so it can only
+        fit a gap that isn't inside one of those: only the overlaps starting in such a gap are looked at,
+        rather than every set aside overlap of every source the blocks touch'''
+    def _refresh_coverage(self, sources):
+        for i in sources:
+            old_coverage = self.coverage_cache.pop(i, None)
+            if not self.stale_overlaps.get(i):
+                continue
+            if old_coverage is None: #No coverage to compare against, so all of them go back
+                for entry in self.stale_overlaps.pop(i):
+                    heapq.heappush(self.overlap_heap, entry)
+                self.stale_starts.pop(i)
+                continue
+
+            coverage = self._source_coverage(i)
+            if coverage == old_coverage:
+                continue
+
+            old_gaps = self._coverage_gaps(old_coverage)
+            old_gap_set = set(old_gaps)
+            starts, entries = self.stale_starts[i], self.stale_overlaps[i]
+            for gap_start, gap_end in self._coverage_gaps(coverage):
+                if gap_start >= gap_end or (gap_start, gap_end) in old_gap_set or \
+                    any(start <= gap_start and gap_end <= end for start, end in old_gaps):
+                    continue
 
-                if merged_block:
-                    if self.debug_mode:
-                        self.log_file.write('Merging Blocks:\n')
-                        self.log_file.write(' '.join(self.blocks[i].merged_text).replace('- ', '') + '\n')
-                        self.log_file.write(' '.join(self.blocks[j].merged_text).replace('- ', '') + '\n')
-                        self.log_file.write(' '.join(merged_block.merged_text).replace('- ', '') + '\n')
-                    self.blocks[i] = merged_block
-                    self.blocks.pop(j)
-                    i = 0
-                    break
-            i += 1
+                lo, hi = bisect_right(starts, gap_start), bisect_left(starts, gap_end)
+                kept = []
+                for entry in entries[lo : hi]:
+                    if entry[3][0] + entry[3][1] >= gap_end:
+                        kept.append(entry)
+                    elif entry[3] in self.overlap_dict[i]:
+                        heapq.heappush(self.overlap_heap, entry)
+                entries[lo : hi] = kept
+                starts[lo : hi] = [entry[3][0] for entry in kept]
 
     def _check_for_source_level_overlap(self, i, j):
 
@@ -251,29 +454,27 @@ class NgramCombiner:
     def get_article_text(self, source, source_start_id, size):
         return self.article_set[source][source_start_id : source_start_id + size]
 
+    '''Rebuilds the text of a block (stored as token ids) as a string'''
+    def get_block_text(self, block):
+        return ' '.join(self.vocab.decode(block.merged_text))
+
 
     def _build_out_block(self, block):
 
         def _find_block_overlap(block):
             overlaps_to_add = []
             new_overlap = False
-            min_max_idxs = block.get_source_min_max()
+            min_max_idxs = block.source_min_max
 
             for source in block.sources:
                 if source in block.banned_sources:
                     continue
                 min_idx, max_idx = min_max_idxs[source]['min_idx'], min_max_idxs[source]['max_idx']
 
-                for overlap in self.overlap_dict[source]:
-                    if overlap[0] < min_idx and overlap[0] + overlap[1] > min_idx:
-                        overlaps_to_add.append((source, *overlap))
-                        new_overlap = True
-                        self.overlap_dict[source].remove(overlap)
-
-                    elif overlap[0] < max_idx and overlap[0] + overlap[1] > max_idx:
-                        overlaps_to_add.append((source, *overlap))
-                        new_overlap = True
-                        self.overlap_dict[source].remove(overlap)
+                #Overlaps straddling either end of the block in this source
+                for overlap in self.overlap_dict[source].pop_straddling(min_idx, max_idx):
+                    overlaps_to_add.append((source, *overlap))
+                    new_overlap = True
 
             return new_overlap, overlaps_to_add
 
@@ -281,6 +482,7 @@ class NgramCombiner:
         new_overlap = True
         while new_overlap :
             new_overlap, overlaps_to_add = _find_block_overlap(block)
+            self.stats.count('overlaps_added', len(overlaps_to_add))
             for add_overlap in overlaps_to_add:
                 new_text = self.get_article_text(add_overlap[0], add_overlap[1], add_overlap[2])
                 block.add_overlap(*add_overlap, new_text)
@@ -288,28 +490,122 @@ class NgramCombiner:
         return block
 
 
+    '''Finds all the pairwise overlaps (matching n-grams longer than MIN_GRAM_LEN) between articles.
+        overlap_method picks how they are found: 'pairwise' aligns every pair of articles with
+        SequenceMatcher, 'ngram_index' builds a single n-gram index over the whole cluster (see NgramIndex).
+        Both produce the same overlaps. Each source's overlaps end up in a SourceOverlapIndex'''
     def _find_overlaps(self):
-        pairs = [(i, j) for i in range(len(self.article_set) - 1) for j in range(i + 1, len(self.article_set))]
+        if self.overlap_method == 'ngram_index':
+            pair_overlaps = NgramIndex(self.article_set, MIN_GRAM_LEN).pair_overlaps()
+        elif self.overlap_cache is not None:
+            pair_overlaps = self._cached_pairwise_overlaps()
+        else:
+            pair_overlaps = self._uncached_pairwise_overlaps(self._article_pairs())
+
         overlap_dict = defaultdict(list)
         longest_match = (0, 0, 0, 0, 0)
 
-        for i, j in pairs:
-            seq = sm(a = self.article_set[i], b = self.article_set[j], autojunk = False)
-            overlaps = sorted(seq.get_matching_blocks(), key = lambda x: x[2], reverse = True)
-
-            k = 0
-            while overlaps[k][2] > MIN_GRAM_LEN:
+        for (i, j), overlaps in pair_overlaps:
+            for overlap in overlaps:
 
-                if overlaps[k][2] > longest_match[4]:
-                    longest_match = (i, overlaps[k][0], j, overlaps[k][1], overlaps[k][2])
+                if overlap[2] > longest_match[4]:
+                    longest_match = (i, overlap[0], j, overlap[1], overlap[2])
 
-                overlap_dict[i].append((overlaps[k][0], overlaps[k][2], j, overlaps[k][1]))
-                overlap_dict[j].append((overlaps[k][1], overlaps[k][2], i, overlaps[k][0]))
-                k += 1
+                overlap_dict[i].append((overlap[0], overlap[2], j, overlap[1]))
+                overlap_dict[j].append((overlap[1], overlap[2], i, overlap[0]))
 
 
         overlap_dict[longest_match[0]].remove((longest_match[1], longest_match[4],
                                                longest_match[2], longest_match[3]))
+        overlap_dict = defaultdict(SourceOverlapIndex, {i: SourceOverlapIndex(overlaps) for i, overlaps in overlap_dict.items()})
+
+        return overlap_dict, Block(*longest_match, self.article_set[longest_match[0]][longest_match[1]:longest_match[1] + longest_match[4]],
+                                   vocab = self.vocab, stats = self.stats)
+
+    def _article_pairs(self):
+        return [(i, j) for i in range(len(self.article_set) - 1) for j in range(i + 1, len(self.article_set))]
+
+    '''Aligns the given article pairs, over a pool of workers if the cluster is big enough'''
+    def _uncached_pairwise_overlaps(self, pairs):
+        if self.stats.enabled:
+            self.stats.count('match_calls', len(pairs))
+            self.stats.count('tokens_aligned', sum([len(self.article_set[i]) + len(self.article_set[j]) for i, j in pairs]))
+        if self.n_workers > 1 and len(self.article_set) >= self.parallel_threshold and pairs:
+            return self._parallel_pairwise_overlaps(pairs)
+        return self._pairwise_overlaps(pairs)
+
+    '''Looks every pair up in overlap_cache first, only aligning (and then caching) the pairs it doesn't have'''
+    def _cached_pairwise_overlaps(self):
+        pairs = self._article_pairs()
+        hashes = [self.overlap_cache.sequence_hash(self.vocab.decode(article)) for article in self.article_set]
+        hash_pairs = [(hashes[i], hashes[j]) for i, j in pairs]
+
+        cached = self.overlap_cache.get_many(hash_pairs)
+        missing = [n for n in range(len(pairs)) if cached[n] is None]
+        computed = list(self._uncached_pairwise_overlaps([pairs[n] for n in missing]))
+        self.overlap_cache.put_many([(hash_pairs[n], overlaps) for n, (_, overlaps) in zip(missing, computed)])
+
+        for n, (_, overlaps) in zip(missing, computed):
+            cached[n] = overlaps
+        return zip(pairs, cached)
+
+    def _pairwise_overlaps(self, pairs = None):
+        if pairs is None:
+            pairs = self._article_pairs()
+        token_lists = [article.tolist() for article in self.article_set]
+
+        for i, j in pairs:
+            yield (i, j), find_pair_overlaps(token_lists[i], token_lists[j])
+
+    '''Same as _pairwise_overlaps, but the pairs are split into batches that are farmed out to a pool of
+        n_workers processes. Batches come back in order, so the overlaps are merged in exactly the same
+        order as the serial loop'''
+    def _parallel_pairwise_overlaps(self, pairs = None):
+        if pairs is None:
+            pairs = self._article_pairs()
+        token_lists = [article.tolist() for article in self.article_set]
+        batch_size = max(1, len(pairs) // (self.n_workers * 4))
+        batches = [pairs[b : b + batch_size] for b in range(0, len(pairs), batch_size)]
+
+        with ProcessPoolExecutor(max_workers = self.n_workers, initializer = _init_overlap_worker,
+                                 initargs = (token_lists,)) as executor:
+            for batch_overlaps in executor.map(_find_batch_overlaps, batches):
+                yield from batch_overlaps
+
+
+'''Finds the overlaps (matching blocks longer than MIN_GRAM_LEN) between two articles, sorted longest first'''
+def find_pair_overlaps(a_tokens, b_tokens):
+    seq = sm(a = a_tokens, b = b_tokens, autojunk = False)
+    overlaps = sorted(seq.get_matching_blocks(), key = lambda x: x[2], reverse = True)
+
+    k = 0
+    while overlaps[k][2] > MIN_GRAM_LEN:
+        k += 1
+
+    return overlaps[:k]
+
+
+'''Hashed (MIN_OVERLAP_GRAM_LEN + 1)-grams of a block's text. Hash collisions can only let an extra pair
+    through to merge_block, never hide a pair that would merge'''
+def merge_signature(tokens):
+    tokens = np.asarray(tokens, dtype = np.uint64)
+    n_grams = len(tokens) - MIN_OVERLAP_GRAM_LEN
+    if n_grams <= 0:
+        return frozenset()
+
+    hashes = np.zeros(n_grams, dtype = np.uint64)
+    for k in range(MIN_OVERLAP_GRAM_LEN + 1):
+        hashes = hashes * np.uint64(1000003) + tokens[k : k + n_grams]
+    return frozenset(hashes.tolist())
+
+
+'''Pool worker side of _parallel_pairwise_overlaps. Each worker gets the cluster's articles once, when it starts,
+    and then only receives batches of article pairs'''
+_worker_token_lists = None
 
-        return overlap_dict, Block(*longest_match, self.article_set[longest_match[0]][longest_match[1]:longest_match[1] + longest_match[4]])
+def _init_overlap_worker(token_lists):
+    global _worker_token_lists
+    _worker_token_lists = token_lists
 
+def _find_batch_overlaps(pairs):
+    return [((i, j), find_pair_overlaps(_worker_token_lists[i], _worker_token_lists[j])) for i, j in pairs]
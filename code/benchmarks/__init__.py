@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the wire cluster synthesizer. synthetic_clusters generates (seeded) synthetic wire
+clusters, run_benchmarks sweeps NgramCombiner.estimate_text over them and writes out the results as json.
+"""
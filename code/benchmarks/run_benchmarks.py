@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Sweeps NgramCombiner.estimate_text over synthetic clusters (see synthetic_clusters), one dimension at a
+time around a base configuration, and reports for each run the wall time, peak memory (tracemalloc),
+n_remaining_blocks and coverage of the first block, as json. Runs offline on CPU.
+
+    python benchmarks/run_benchmarks.py [--out results.json] [--quick] [--repeats N] [--overlap-method M] [--no-memory]
+
+With --clusters, the real clusters in the given wire cluster files are run instead (sanitized as
+WireFileCombiner does), each reporting its wall time split into estimate_text's phases (see CombinerStats),
+so a change to one phase can be checked on real data, and against the others:
+
+    python benchmarks/run_benchmarks.py --clusters ../data/clusters/* [--max-articles N] [--ids 310 ...]
+
+(from the code directory). Results are a json object with the base configuration (or the cluster files)
+and a list of runs, so runs from different commits can be diffed to track regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from WireNgramCombiner import NgramCombiner
+from wire_cluster_reader import iter_wire_clusters
+from text_sanitizer import sanitize_all
+from synthetic_clusters import generate_cluster
+
+BASE_CONFIG = {'n_articles': 10, 'article_len': 400, 'ocr_noise': .01, 'truncation': .3, 'junk': .2}
+
+SWEEPS = {
+    'n_articles': [2, 5, 10, 20, 40],
+    'article_len': [100, 200, 400, 800, 1600],
+    'ocr_noise': [0, .005, .01, .02, .05],
+    'truncation': [0, .2, .4, .6, .8],
+    'junk': [0, .2, .5, .8, 1],
+}
+
+QUICK_SWEEPS = {
+    'n_articles': [2, 5, 10],
+    'article_len': [100, 200],
+    'ocr_noise': [0, .02],
+    'truncation': [0, .5],
+    'junk': [0, .5],
+}
+
+
+'''Runs estimate_text on a synthetic cluster, returning its measurements. tracemalloc slows everything down
+    quite a bit, so the peak memory comes from a second (traced) run rather than the timed one'''
+def run_one(config, seed, overlap_method = 'pairwise', measure_memory = True):
+    articles = generate_cluster(seed = seed, **config)
+
+    start_time = time.perf_counter()
+    results = NgramCombiner(articles, overlap_method = overlap_method).estimate_text()
+    elapsed = time.perf_counter() - start_time
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        NgramCombiner(articles, overlap_method = overlap_method).estimate_text()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+            'config': config,
+            'seed': seed,
+            'elapsed': elapsed,
+            'peak_memory_bytes': peak_memory,
+            'n_remaining_blocks': results['n_remaining_blocks'],
+            'coverage': results['block_coverages'][0],
+            }
+
+'''Varies each dimension in sweeps in turn, holding the others at base_config'''
+def run_sweeps(sweeps, base_config = BASE_CONFIG, repeats = 1, seed = 0, overlap_method = 'pairwise', measure_memory = True):
+    runs = []
+    for dimension, values in sweeps.items():
+        for value in values:
+            config = dict(base_config, **{dimension: value})
+            for repeat in range(repeats):
+                run = run_one(config, seed + repeat, overlap_method, measure_memory)
+                run['dimension'] = dimension
+                runs.append(run)
+                print('{}={}: {:.3f}s'.format(dimension, value, run['elapsed']), file = sys.stderr)
+    return runs
+
+'''Runs estimate_text on every cluster in the given files with at most max_articles articles (and in ids, if
+    given), returning each one's measurements'''
+def run_real(paths, max_articles = None, ids = None, overlap_method = 'pairwise'):
+    runs = []
+    for path in paths:
+        for k, articles in iter_wire_clusters(path):
+            if (ids and k not in ids) or (max_articles is not None and len(articles) > max_articles):
+                continue
+            article_set = sanitize_all([articles[i] for i in articles.keys()], 'aligning')
+
+            start_time = time.perf_counter()
+            results = NgramCombiner(article_set, overlap_method = overlap_method, stats = True).estimate_text()
+            elapsed = time.perf_counter() - start_time
+
+            runs.append({
+                         'file': os.path.basename(path),
+                         'cluster_id': k,
+                         'n_articles': len(article_set),
+                         'n_tokens': sum(len(article.split()) for article in article_set),
+                         'elapsed': elapsed,
+                         'phases': results['stats']['times'],
+                         'n_remaining_blocks': results['n_remaining_blocks'],
+                         'coverage': results['block_coverages'][0],
+                         })
+            print('{} {} ({} articles): {:.3f}s'.format(os.path.basename(path), k, len(article_set), elapsed), file = sys.stderr)
+    return runs
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Sweep NgramCombiner over synthetic wire clusters')
+    parser.add_argument('--out', default = None, help = 'json file to write the results to (default: stdout)')
+    parser.add_argument('--quick', action = 'store_true', help = 'a smaller sweep, for a quick check')
+    parser.add_argument('--repeats', type = int, default = 1, help = 'runs (with different seeds) per configuration')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--overlap-method', default = 'pairwise', choices = ['pairwise', 'ngram_index'])
+    parser.add_argument('--no-memory', action = 'store_true', help = 'skip the (slower) peak memory runs')
+    parser.add_argument('--clusters', nargs = '+', default = None, help = 'wire cluster files to run the real clusters of')
+    parser.add_argument('--max-articles', type = int, default = None, help = 'with --clusters, skip clusters with more articles')
+    parser.add_argument('--ids', nargs = '+', default = None, help = 'with --clusters, only run these clusters')
+    args = parser.parse_args(argv[1:])
+
+    if args.clusters:
+        runs = run_real(args.clusters, args.max_articles, args.ids, args.overlap_method)
+        output = {
+                  'clusters': [os.path.basename(path) for path in args.clusters],
+                  'max_articles': args.max_articles,
+                  'overlap_method': args.overlap_method,
+                  'python': platform.python_version(),
+                  'total_elapsed': sum(run['elapsed'] for run in runs),
+                  'runs': runs,
+                  }
+    else:
+        runs = run_sweeps(QUICK_SWEEPS if args.quick else SWEEPS, repeats = args.repeats, seed = args.seed,
+                          overlap_method = args.overlap_method, measure_memory = not args.no_memory)
+        output = {
+                  'base_config': BASE_CONFIG,
+                  'overlap_method': args.overlap_method,
+                  'python': platform.python_version(),
+                  'runs': runs,
+                  }
+
+    if args.out:
+        with open(args.out, 'w') as outfile:
+            json.dump(output, outfile, indent = 1)
+    else:
+        json.dump(output, sys.stdout, indent = 1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
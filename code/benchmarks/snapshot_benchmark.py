@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Times restoring a model's base weights from an in-memory WeightSnapshot against reloading the model with
+from_pretrained, which is what independent per-cluster fine tunes would otherwise cost. Reports the
+min and mean of each over several repeats, as json.
+
+from_pretrained can map the weights file lazily, leaving the actual reading (and copying, once the
+weights get trained) to the first training step, so the reload timing includes writing every parameter
+once, as that first optimizer step would.
+
+    python benchmarks/snapshot_benchmark.py [--model sshleifer/tiny-gpt2] [--repeats N] [--out results.json]
+
+(from the code directory). Needs torch and transformers, and the model cached locally or downloadable.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from WeightSnapshot import WeightSnapshot
+
+
+def _timings(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start_time)
+    return {'min': min(times), 'mean': sum(times) / len(times)}
+
+'''Reloads the model, then writes each of its parameters once'''
+def _reload(model_name):
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(0)
+    return model
+
+def run_benchmark(model_name, repeats = 5):
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    start_time = time.perf_counter()
+    snapshot = WeightSnapshot(model)
+    snapshot_time = time.perf_counter() - start_time
+
+    #Dirty the weights, so restore has real work to do
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.add_(1)
+
+    return {
+            'model': model_name,
+            'n_parameters': sum(parameter.numel() for parameter in model.parameters()),
+            'snapshot': snapshot_time,
+            'restore': _timings(snapshot.restore, repeats),
+            'reload': _timings(lambda: _reload(model_name), repeats),
+            }
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Time WeightSnapshot.restore against reloading the model')
+    parser.add_argument('--model', default = 'sshleifer/tiny-gpt2')
+    parser.add_argument('--repeats', type = int, default = 5)
+    parser.add_argument('--out', default = None, help = 'json file to write the results to (default: stdout)')
+    args = parser.parse_args(argv[1:])
+
+    output = run_benchmark(args.model, args.repeats)
+    if args.out:
+        with open(args.out, 'w') as outfile:
+            json.dump(output, outfile, indent = 1)
+    else:
+        json.dump(output, sys.stdout, indent = 1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
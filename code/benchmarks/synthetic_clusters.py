@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded generator of synthetic wire clusters, modelled on what the real article sources look like:
+every article is a copy of one underlying wire story, but
+    - publishers run only part of the story (truncation: up to that fraction of the story is cut,
+      from the start and/or the end),
+    - OCR mangles characters (ocr_noise: the chance any character is substituted, dropped or doubled),
+    - layout detection picks up text from neighbouring boxes (junk: the chance an article gets a run of
+      unrelated words prepended, and again appended).
+
+Articles come out sanitized, like WireFileCombiner.article_sets, so they can go straight into
+NgramCombiner. The same parameters and seed always give the same cluster.
+"""
+
+import random
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def _make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 10))))
+    return sorted(words)
+
+def _make_story(rng, vocabulary, n_words):
+    words = []
+    sentence_len = 0
+    for _ in range(n_words):
+        word = rng.choice(vocabulary)
+        if sentence_len == 0:
+            word = word.capitalize()
+        sentence_len += 1
+        if sentence_len > rng.randint(8, 25):
+            word += '.'
+            sentence_len = 0
+        elif rng.random() < .05:
+            word += ','
+        words.append(word)
+    return words
+
+def _ocr_noise(rng, word, ocr_noise):
+    if not ocr_noise:
+        return word
+
+    chars = []
+    for char in word:
+        roll = rng.random()
+        if roll < ocr_noise / 3:
+            chars.append(rng.choice(LETTERS))
+        elif roll < 2 * ocr_noise / 3:
+            continue
+        elif roll < ocr_noise:
+            chars.extend([char, char])
+        else:
+            chars.append(char)
+    return ''.join(chars) or word
+
+'''Returns a list of n_articles article texts, all copies of the same article_len word story'''
+def generate_cluster(n_articles = 10, article_len = 400, ocr_noise = .01, truncation = .3, junk = .2, seed = 0):
+    rng = random.Random(seed)
+    vocabulary = _make_vocabulary(rng, 2000)
+    story = _make_story(rng, vocabulary, article_len)
+
+    articles = []
+    for _ in range(n_articles):
+        cut = int(rng.random() * truncation * article_len)
+        cut_start = rng.randint(0, cut)
+        words = story[cut_start : article_len - (cut - cut_start)]
+
+        words = [_ocr_noise(rng, word, ocr_noise) for word in words]
+        if rng.random() < junk:
+            words = _make_story(rng, vocabulary, rng.randint(5, 60)) + words
+        if rng.random() < junk:
+            words = words + _make_story(rng, vocabulary, rng.randint(5, 60))
+
+        articles.append(' '.join(words))
+
+    return articles
@@ -5,7 +5,7 @@ Created on Thu Aug 18 13:11:45 2022
 @author: bryan
 """
 import json
-import re
+from text_sanitizer import sanitize
 
 fileslist = [r"C:\Users\bryan\Documents\NBER\wire_clusters\synthesizer\data\clusters\predicted_clusters_Jun-22-1973.txt",
              r"C:/Users/bryan/Documents/NBER/wire_clusters/synthesizer/data/clusters/predicted_clusters_May-10-1949.json" ]
@@ -24,20 +24,7 @@ def sanitize_before_aligning(text):
         Same text, with normalized whitespace (any whitespace replaced with a single space)
 
     """
-    pattern = re.compile('[^A-Za-z0-9\s!#\$%&\*\(\)_\?\/\+-=\[\]:;\'",\.]\+\u2014')
-    text = pattern.sub('', text)
-
-    text = re.sub('\u2014', '--', text) #em dash replaced with spaces--seem to often be equivalent in transcriptions
-    text = re.sub('[\u201c\u201d\u2018]', '"', text)
-    text = re.sub('\u2019', '\'', text)
-    text = re.sub(' \. ', ' \.', text)
-    text = re.sub(' , ', ', ', text)
-    text = re.sub(' \' ', '\'', text)
-    text = re.sub('\|', '', text)
-    text = re.sub('\"', '\'', text)
-    text = re.sub('\s+', ' ', text) #Any length whitespace replace with a single space
-    text = re.sub('- ', '', text)
-    return re.sub(r'[^A-Za-z0-9\.\-,\s+]', '', text).strip()
+    return sanitize(text, 'training_text')
 
 all_article_texts = []
 for file in fileslist:
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Entry point for the n-gram (rule based) part of the synthesizer only: merges every cluster in a wire
+cluster file and writes the results out, without ever importing torch, transformers or pandas.
+
+    python merge_wire_clusters.py <filepath_to_clusters> <filepath_to_output> [options]
+
+Output ending in .jsonl is written one cluster at a time as each finishes (see ResultWriter), and a rerun
+with the same output picks up where the last one stopped. Any other output is written as a single json,
+as WireFileCombiner.output_all does.
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(__file__))
+from WireFileCombiner import WireFileCombiner, MIN_BLOCK_COVERAGE
+from ResultWriter import ResultWriter
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = 'Rule based synthesis of every cluster in a wire cluster file')
+    parser.add_argument('filepath', help = 'json of wire clusters')
+    parser.add_argument('outpath', help = 'where to write the results (.jsonl to stream and resume)')
+    parser.add_argument('--workers', type = int, default = 1, help = 'processes to merge clusters over')
+    parser.add_argument('--overlap-method', default = 'pairwise', choices = ['pairwise', 'ngram_index'])
+    parser.add_argument('--overlap-workers', type = int, default = 1,
+                        help = 'processes to find the overlaps of very large clusters over')
+    parser.add_argument('--overlap-cache', default = None, help = 'SQLite file to cache pairwise overlaps in')
+    parser.add_argument('--coverage-target', type = float, nargs = '?', const = MIN_BLOCK_COVERAGE, default = None,
+                        help = 'stop merging a cluster once its leading block covers this share of it (alone: {})'.format(MIN_BLOCK_COVERAGE))
+    parser.add_argument('--eager', action = 'store_true', help = 'load the whole file up front rather than streaming it')
+    args = parser.parse_args(argv[1:])
+
+    combiner = WireFileCombiner(args.filepath, overlap_method = args.overlap_method, overlap_workers = args.overlap_workers,
+                                lazy = not args.eager, overlap_cache_path = args.overlap_cache,
+                                coverage_target = args.coverage_target)
+
+    if args.outpath.endswith('.jsonl'):
+        with ResultWriter(args.outpath) as writer:
+            combiner.merge_texts(n_workers = args.workers, writer = writer)
+    else:
+        combiner.merge_texts(n_workers = args.workers)
+        combiner.output_all(args.outpath)
+
+    for k, error in combiner.merge_errors.items():
+        print('Cluster {} failed:\n{}'.format(k, error), file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
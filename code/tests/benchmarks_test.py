@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the benchmark package: synthetic clusters are reproducible, and a benchmark run reports
+everything it should
+"""
+
+import pytest
+import json
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from benchmarks.synthetic_clusters import generate_cluster
+from benchmarks.run_benchmarks import run_one
+
+def test_generator_is_seeded():
+    config = {'n_articles': 4, 'article_len': 80, 'ocr_noise': .05, 'truncation': .5, 'junk': .5}
+    assert generate_cluster(seed = 4, **config) == generate_cluster(seed = 4, **config)
+    assert generate_cluster(seed = 4, **config) != generate_cluster(seed = 5, **config)
+    assert len(generate_cluster(seed = 4, **config)) == 4
+
+def test_run_one():
+    run = run_one({'n_articles': 3, 'article_len': 60, 'ocr_noise': 0, 'truncation': .2, 'junk': 0}, seed = 1)
+    assert set(run) == {'config', 'seed', 'elapsed', 'peak_memory_bytes', 'n_remaining_blocks', 'coverage'}
+    assert run['peak_memory_bytes'] > 0 and 0 < run['coverage'] <= 1
+    json.dumps(run)
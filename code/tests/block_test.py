@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for Block, in particular that adding chunks incrementally gives exactly the same
+block as rebuilding it from scratch
+"""
+
+import pytest
+import random
+import sys, os
+
+import numpy as np
+
+sys.path.append(os.path.abspath('.'))
+from Block import Block
+from Chunk import Chunk
+from Vocabulary import Vocabulary
+
+@pytest.fixture
+def set_up_articles():
+    rng = random.Random(5)
+    vocab = Vocabulary()
+    words = ['w{}'.format(i) for i in range(12)]
+    articles = [vocab.encode([rng.choice(words) for _ in range(120)]) for _ in range(6)]
+    return rng, vocab, articles
+
+def _rebuild(chunks, vocab):
+    '''What Block.add_overlap used to do after adding chunks: shift indexes, sort, recompile text'''
+    min_index = min(chunk.block_idx for chunk in chunks)
+    for chunk in chunks:
+        chunk.block_idx -= min_index
+    chunks = sorted(chunks, key = lambda x: x.block_idx)
+
+    text = []
+    cur_idx = 0
+    for chunk in chunks:
+        if chunk.block_idx <= cur_idx and chunk.block_idx + chunk.size >= cur_idx:
+            new_text = chunk.text[cur_idx - chunk.block_idx : ]
+            text.extend(new_text.tolist())
+            cur_idx += len(new_text)
+    return chunks, text
+
+def test_insert_chunks_matches_rebuild(set_up_articles):
+    rng, vocab, articles = set_up_articles
+
+    for trial in range(30):
+        x, y = rng.sample(range(len(articles)), 2)
+        block = Block(x, 10, y, 10, 20, articles[x][10:30], vocab = vocab)
+        reference = [Chunk(c.source, c.block_idx, c.source_idx, c.size, c.text) for c in block.chunks]
+
+        for step in range(25):
+            source = rng.randrange(len(articles))
+            block_idx = rng.randint(-15, len(block) + 5)
+            source_idx = rng.randint(0, 100)
+            size = rng.randint(1, 20)
+            #Occasionally a chunk with less text than its size
+            text = articles[source][source_idx : source_idx + size - (rng.random() < .1)]
+
+            new_chunks = [Chunk(source, block_idx, source_idx, size, text), Chunk(x, block_idx, source_idx, size, text)]
+            reference.extend([Chunk(c.source, c.block_idx, c.source_idx, c.size, c.text) for c in new_chunks])
+            block._insert_chunks(new_chunks)
+            reference, reference_text = _rebuild(reference, vocab)
+
+            assert block.chunks == reference, 'Incremental chunk order differs from a rebuild'
+            assert block.merged_text.tolist() == reference_text, 'Incremental merged text differs from a rebuild'
+            assert block.source_min_max == block.get_source_min_max(), 'Incremental source bounds differ from a rebuild'
+
+            rebuilt = Block(list(block.chunks), vocab = vocab)
+            assert np.array_equal(rebuilt.merged_text, block.merged_text)
+            assert rebuilt.frontiers == block.frontiers, 'Frontiers out of sync with the chunks'
+
+def test_trimmed_chunks_point_into_source(set_up_articles):
+    rng, vocab, articles = set_up_articles
+
+    for trial in range(200):
+        source = rng.randrange(len(articles))
+        source_idx, size, block_idx = rng.randint(0, 80), rng.randint(1, 30), rng.randint(0, 20)
+        chunk = Chunk(source, block_idx, source_idx, size, articles[source][source_idx : source_idx + size])
+        blk_start = rng.randint(0, 40)
+        blk_stop = rng.randint(blk_start + 1, 60)
+
+        trimmed = chunk.trim_to_slice(blk_start, blk_stop)
+        if trimmed is not None:
+            assert np.array_equal(trimmed.text, articles[source][trimmed.source_idx : trimmed.source_idx + trimmed.size]), \
+                'Trimmed chunk text no longer matches its source'
+            assert np.shares_memory(trimmed.text, articles[source]) or trimmed.size == 0, 'Trimmed chunk copied its text'
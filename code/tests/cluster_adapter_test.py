@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for ClusterAdapter and AdapterCache
+"""
+
+import pytest
+import sys, os
+
+torch = pytest.importorskip('torch')
+
+sys.path.append(os.path.abspath('.'))
+from ClusterAdapter import ClusterAdapter, AdapterCache, adapter_parameter_names
+
+class TinyModel(torch.nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.h = torch.nn.ModuleList([torch.nn.Linear(4, 4) for _ in range(2)])
+        self.ln_f = torch.nn.LayerNorm(4)
+
+def test_parameter_names():
+    model = TinyModel()
+    assert adapter_parameter_names(model, 'bias') == ['h.0.bias', 'h.1.bias', 'ln_f.bias']
+    assert adapter_parameter_names(model, 'last_layer') == ['h.1.weight', 'h.1.bias', 'ln_f.weight', 'ln_f.bias']
+
+def test_delta_round_trip(tmp_path):
+    model = TinyModel()
+    adapter = ClusterAdapter(model, 'last_layer')
+    assert not model.h[0].weight.requires_grad and model.h[1].weight.requires_grad
+    base = model.h[1].weight.detach().clone()
+
+    with torch.no_grad():
+        model.h[1].weight.add_(1)
+    delta = adapter.delta()
+
+    cache = AdapterCache(str(tmp_path))
+    key = cache.key('tiny', 7, ['some text'], {'adapter_mode': 'last_layer'})
+    assert cache.get(key) is None
+    cache.put(key, delta)
+
+    adapter.reset()
+    assert torch.equal(model.h[1].weight, base)
+    adapter.apply(cache.get(key))
+    assert torch.allclose(model.h[1].weight, base + 1)
+    assert key != cache.key('tiny', 7, ['other text'], {'adapter_mode': 'last_layer'})
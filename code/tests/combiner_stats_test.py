@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the optional NgramCombiner instrumentation
+"""
+
+import pytest
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from WireNgramCombiner import NgramCombiner
+from benchmarks.synthetic_clusters import generate_cluster
+
+def test_stats_recorded_and_results_unchanged():
+    articles = generate_cluster(n_articles = 6, article_len = 150, ocr_noise = .02, seed = 3)
+    hooked = []
+
+    plain = NgramCombiner(articles).estimate_text()
+    instrumented = NgramCombiner(articles, stats_hook = hooked.append).estimate_text()
+
+    assert 'stats' not in plain
+    assert hooked == [instrumented['stats']]
+    for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+        assert plain[key] == instrumented[key], 'Instrumentation changed {}'.format(key)
+
+    times, counts = instrumented['stats']['times'], instrumented['stats']['counts']
+    assert set(times) == {'find_overlaps', 'build_out_block', 'coverage', 'merge_blocks', 'results'}
+    assert counts['match_calls'] >= 15 and counts['tokens_aligned'] > 0
+    assert counts['blocks_created'] - counts['merges'] == instrumented['n_remaining_blocks']
+    assert counts['merges'] <= counts['merge_attempts']
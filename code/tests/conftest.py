@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures shared by the tests that run the neural stack end to end: a tiny randomly initialized GPT-2 with
+a word level tokenizer, built locally so nothing is downloaded. Skipped without torch and transformers
+"""
+
+import pytest
+
+WORDS = ['w{}'.format(i) for i in range(40)] + ['the', 'start', 'of', 'it', 'all', 'middle', 'bit', 'end']
+
+@pytest.fixture
+def tiny_lm():
+    torch = pytest.importorskip('torch')
+    pytest.importorskip('transformers')
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast, GPT2Config, GPT2LMHeadModel
+
+    word_level = Tokenizer(models.WordLevel({w: i for i, w in enumerate(['<|endoftext|>'] + WORDS)}, unk_token = '<|endoftext|>'))
+    word_level.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object = word_level, eos_token = '<|endoftext|>',
+                                        clean_up_tokenization_spaces = False)
+    tokenizer.add_special_tokens({'additional_special_tokens': ['<|c1|>']})
+
+    #Large, untied initial weights so greedy decoding doesn't just repeat the last prompt token. Enough
+    #positions for GptFineTuner's packed sequences
+    torch.manual_seed(0)
+    model = GPT2LMHeadModel(GPT2Config(vocab_size = len(tokenizer), n_positions = 1024, n_embd = 32, n_layer = 2, n_head = 2,
+                                       initializer_range = 1.0, tie_word_embeddings = False))
+    return model, tokenizer
+
+@pytest.fixture
+def tiny_lm_path(tiny_lm, tmp_path):
+    '''tiny_lm saved to a directory, for the code that loads its model with from_pretrained'''
+    model, tokenizer = tiny_lm
+    path = str(tmp_path / 'tiny_lm')
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
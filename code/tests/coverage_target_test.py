@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for NgramCombiner's coverage target early exit
+"""
+
+import pytest
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from WireNgramCombiner import NgramCombiner
+from benchmarks.synthetic_clusters import generate_cluster
+
+@pytest.fixture
+def articles():
+    return generate_cluster(n_articles = 8, article_len = 200, ocr_noise = .03, junk = .4, seed = 11)
+
+def test_stops_once_leading_block_covers_target(articles):
+    full = NgramCombiner(articles, stats = True).estimate_text()
+    early = NgramCombiner(articles, stats = True, coverage_target = .2).estimate_text()
+
+    assert 'stopped_early' not in full
+    assert early['stopped_early']
+    assert early['block_coverages'][0] >= .2
+    assert early['stats']['counts']['blocks_created'] < full['stats']['counts']['blocks_created']
+
+def test_unreachable_target_changes_nothing(articles):
+    full = NgramCombiner(articles).estimate_text()
+    target = NgramCombiner(articles, coverage_target = 1).estimate_text()
+
+    assert not target['stopped_early']
+    for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+        assert full[key] == target[key]
+
+def test_bad_target(articles):
+    with pytest.raises(ValueError):
+        NgramCombiner(articles, coverage_target = 1.5)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the batch planning of GenerationScheduler, and WireNeuralCombiner's gaps. With torch and
+transformers installed, both are also run end to end on a tiny randomly initialized GPT-2 (tiny_lm, see
+conftest.py)
+"""
+
+import pytest
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from GenerationScheduler import GenerationScheduler, plan_batches
+from WireNeuralCombiner import WireNeuralCombiner
+
+def test_plan_batches():
+    lengths = [30, 5, 10, 5, 200, 12]
+    batches = plan_batches(lengths, max_batch_tokens = 100, max_new_tokens = 10)
+
+    assert batches == [[1, 3, 2, 5], [0], [4]]
+    for batch in batches[:-1]:
+        assert len(batch) * (max(lengths[k] for k in batch) + 10) <= 100
+    assert plan_batches([]) == []
+
+def test_gap_prompts_and_assemble():
+    merge_results = {'blocks': ['middle bit', 'the start of it all', 'end'], 'block_coverages': [.2, .7, .1]}
+    combiner = WireNeuralCombiner(None, None, merge_results, cluster_id = 'c1')
+
+    assert combiner.n_gaps == 2
+    assert combiner.gap_prompts() == ['<|c1|>the start of it all', '<|c1|>middle bit']
+    assert combiner.assemble([' and then ', '']) == 'the start of it all and then middle bit end'
+
+def test_empty_merge_results():
+    combiner = WireNeuralCombiner(None, None, {}, cluster_id = 'c1')
+
+    assert combiner.n_gaps == 0 and combiner.gap_prompts() == []
+    assert combiner.assemble([]) == ''
+
+def test_run_matches_unbatched(tiny_lm):
+    model, tokenizer = tiny_lm
+    prompts = ['w1 w2 w3', 'w4', 'w5 w6 w7 w8 w9 w10 w11', '<|c1|>the start of it all', 'w3 w3']
+
+    outputs = []
+    #Every prompt alone, all of them in one batch, and batches of prompts padded to different widths
+    for max_batch_tokens in (1, 10000, 40):
+        scheduler = GenerationScheduler(model, tokenizer, max_batch_tokens = max_batch_tokens, max_new_tokens = 6)
+        for k, prompt in enumerate(prompts):
+            scheduler.add(k, prompt)
+        outputs.append(scheduler.run())
+        assert len(scheduler) == 0
+
+    assert sorted(outputs[0]) == list(range(len(prompts)))
+    assert all(0 < len(text.split()) <= 6 for text in outputs[0].values())
+    assert outputs[1] == outputs[0] and outputs[2] == outputs[0]
+
+def test_estimate_text(tiny_lm):
+    model, tokenizer = tiny_lm
+    merge_results = {'blocks': ['middle bit', 'the start of it all', 'end'], 'block_coverages': [.2, .7, .1]}
+    combiner = WireNeuralCombiner(model, tokenizer, merge_results, cluster_id = 'c1')
+
+    scheduler = GenerationScheduler(model, tokenizer)
+    for gap, prompt in enumerate(combiner.gap_prompts()):
+        scheduler.add(gap, prompt)
+    outputs = scheduler.run()
+
+    text = combiner.estimate_text()
+    assert text == combiner.assemble([outputs[0], outputs[1]])
+    assert text.startswith('the start of it all ') and text.endswith(' end') and ' middle bit ' in text
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for GptFineTuner's sequence packing and batching, and the batched fine tune itself on tiny_lm
+(see conftest.py)
+"""
+
+import math
+import pytest
+import sys, os
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+sys.path.append(os.path.abspath('.'))
+from GptFineTuner import pack_sequences, collate_rows, IGNORE_INDEX
+
+def test_pack_sequences():
+    sequences = [torch.arange(n) for n in (5, 4, 3, 2, 9)]
+    rows = pack_sequences(sequences, 8)
+
+    assert [[len(s) for s in row] for row in rows] == [[5, 3], [4, 2], [8]]
+    assert all(sum(len(s) for s in row) <= 8 for row in rows)
+
+def test_collate_rows():
+    rows = [[torch.tensor([1, 2]), torch.tensor([3])], [torch.tensor([4])]]
+    batch = collate_rows(rows, pad_token_id = 0)
+
+    assert batch['input_ids'].tolist() == [[1, 2, 3], [4, 0, 0]]
+    assert batch['attention_mask'].tolist() == [[1, 1, 1], [1, 0, 0]]
+    assert batch['labels'].tolist() == [[1, 2, 3], [4, IGNORE_INDEX, IGNORE_INDEX]]
+
+class RecordingOptimizer:
+    '''Stands in for the optimizer: records the gradients at each step, without changing any weights'''
+
+    def __init__(self, parameters):
+        self.parameters = list(parameters)
+        self.steps = []
+
+    def step(self):
+        self.steps.append([parameter.grad.clone() for parameter in self.parameters])
+
+    def zero_grad(self):
+        for parameter in self.parameters:
+            parameter.grad = None
+
+def _fine_tuner(tiny_lm, lengths):
+    '''A GptFineTuner over one sequence per length (cluster tag, words, end of text), with max_seq_len set so
+        no two of them fit in a row'''
+    import pandas as pd
+    from conftest import WORDS
+    from GptFineTuner import GptFineTuner
+
+    model, tokenizer = tiny_lm
+    for module in model.modules():
+        if isinstance(module, torch.nn.Dropout):
+            module.p = 0
+    frame = pd.DataFrame({'cluster_id': 'c1', 'text': [' '.join(WORDS[k : k + n - 2]) for k, n in enumerate(lengths)]})
+    fine_tuner = GptFineTuner(model, tokenizer, frame, max_seq_len = max(lengths))
+    assert sorted(len(text) for text in fine_tuner.wire_set.texts) == sorted(lengths)
+    return fine_tuner
+
+def _mean_loss(fine_tuner):
+    fine_tuner.model.eval()
+    with torch.no_grad():
+        batch = collate_rows([[text] for text in fine_tuner.wire_set.texts], fine_tuner.tokenizer.eos_token_id)
+        return float(fine_tuner.model(**batch).loss)
+
+def test_batched_loss_goes_down(tiny_lm):
+    fine_tuner = _fine_tuner(tiny_lm, [7, 8, 9, 10, 11])
+    before = _mean_loss(fine_tuner)
+    fine_tuner.fine_tune(lr = 1e-2, n_epochs = 5, batch_size = 2)
+    assert _mean_loss(fine_tuner) < before
+
+@pytest.mark.parametrize('accumulation_steps', [1, 2, 3, 5])
+def test_accumulation_steps(tiny_lm, accumulation_steps):
+    fine_tuner = _fine_tuner(tiny_lm, [7, 8, 9, 10, 11, 9, 8])
+    optimizer = RecordingOptimizer(fine_tuner.model.parameters())
+    fine_tuner.fine_tune(n_epochs = 2, batch_size = 2, accumulation_steps = accumulation_steps, optimizer = optimizer)
+
+    #7 rows make 4 batches per epoch
+    assert len(optimizer.steps) == 2 * math.ceil(4 / accumulation_steps)
+
+def test_padding_does_not_change_gradients(tiny_lm):
+    #Rows of different lengths, so batches are padded--first with the end of text token, then another
+    grads = []
+    for pad_token in (None, 'w39'):
+        fine_tuner = _fine_tuner(tiny_lm, [7, 11, 9, 8])
+        fine_tuner.tokenizer.pad_token = pad_token
+        optimizer = RecordingOptimizer(fine_tuner.model.parameters())
+        torch.manual_seed(0)
+        fine_tuner.fine_tune(n_epochs = 1, batch_size = 2, optimizer = optimizer)
+        grads.append(optimizer.steps)
+
+    assert fine_tuner.tokenizer.pad_token_id != fine_tuner.tokenizer.eos_token_id
+    assert len(grads[0]) == len(grads[1]) == 2
+    for step, other_step in zip(*grads):
+        assert all(torch.allclose(grad, other_grad, atol = 1e-6) for grad, other_grad in zip(step, other_step))
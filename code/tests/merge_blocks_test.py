@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the block merge scheduler in NgramCombiner, checking it merges exactly the blocks
+the old full (i, j) scan did
+"""
+
+import pytest
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from WireNgramCombiner import NgramCombiner
+from benchmarks.synthetic_clusters import generate_cluster
+
+@pytest.fixture
+def set_up_fragmented_cluster():
+    #Short, noisy excerpts so estimate_text ends up with several blocks to merge
+    return generate_cluster(n_articles = 14, article_len = 200, ocr_noise = .03, truncation = .8, junk = .3, seed = 1)
+
+def _full_scan_merge_blocks(combiner):
+    '''The old _merge_blocks: try every pair, starting over after each merge'''
+    changed_sources = set()
+    i = 0
+    while i < len(combiner.blocks):
+        for j in range(i + 1, len(combiner.blocks)):
+            merged_block = combiner.blocks[i].merge_block(combiner.blocks[j])
+            if merged_block:
+                combiner.blocks[i] = merged_block
+                combiner.blocks.pop(j)
+                changed_sources |= merged_block.sources
+                i = 0
+                break
+        i += 1
+    return changed_sources
+
+def test_merge_scheduler_matches_full_scan(set_up_fragmented_cluster):
+    scheduled = NgramCombiner(set_up_fragmented_cluster)
+    full_scan = NgramCombiner(set_up_fragmented_cluster)
+    full_scan._add_block = full_scan.blocks.append
+    full_scan._merge_blocks = lambda: _full_scan_merge_blocks(full_scan)
+
+    scheduled_results, full_scan_results = scheduled.estimate_text(), full_scan.estimate_text()
+    for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+        assert scheduled_results[key] == full_scan_results[key], 'Different {} with the merge scheduler'.format(key)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the NgramIndex overlap engine, checking it finds exactly the same
+overlaps as the pairwise SequenceMatcher loop
+"""
+
+import pytest
+import random
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from NgramIndex import NgramIndex
+from WireNgramCombiner import NgramCombiner, MIN_GRAM_LEN
+
+@pytest.fixture
+def set_up_cluster():
+    rng = random.Random(11)
+    vocab = ['w{}'.format(i) for i in range(40)]
+    base = [rng.choice(vocab) for _ in range(300)]
+
+    articles = []
+    for _ in range(8):
+        start, stop = rng.randint(0, 60), rng.randint(200, 300)
+        article = list(base[start:stop])
+        for _ in range(rng.randint(0, 12)):
+            article[rng.randrange(len(article))] = rng.choice(vocab)
+        article = [rng.choice(vocab) for _ in range(rng.randint(0, 15))] + article
+        articles.append(' '.join(article))
+
+    #Repeated passages within and across articles
+    articles.append(' '.join(base[50:80] + base[50:80] + base[10:40]))
+    return articles
+
+def test_ngram_index_matches_pairwise(set_up_cluster):
+    combiner = NgramCombiner(set_up_cluster)
+    pairwise = {pair: [tuple(o) for o in overlaps] for pair, overlaps in combiner._pairwise_overlaps() if overlaps}
+    indexed = {pair: overlaps for pair, overlaps in NgramIndex(combiner.article_set, MIN_GRAM_LEN).pair_overlaps() if overlaps}
+
+    assert pairwise, 'Test cluster should have some overlaps'
+    assert indexed == pairwise, 'NgramIndex overlaps differ from the pairwise SequenceMatcher overlaps'
+
+def test_ngram_index_estimate_text(set_up_cluster):
+    pairwise_results = NgramCombiner(set_up_cluster).estimate_text()
+    indexed_results = NgramCombiner(set_up_cluster, overlap_method = 'ngram_index').estimate_text()
+
+    for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+        assert pairwise_results[key] == indexed_results[key], 'Different {} with the ngram_index overlap method'.format(key)
+
+def test_bad_overlap_method(set_up_cluster):
+    with pytest.raises(ValueError):
+        NgramCombiner(set_up_cluster, overlap_method = 'suffix_tree')
+
+def test_parallel_pairwise_matches_serial(set_up_cluster):
+    serial = NgramCombiner(set_up_cluster)
+    parallel = NgramCombiner(set_up_cluster, n_workers = 2, parallel_threshold = 2)
+    serial_overlaps, serial_block = serial._find_overlaps()
+    parallel_overlaps, parallel_block = parallel._find_overlaps()
+
+    assert {i: list(o) for i, o in parallel_overlaps.items()} == {i: list(o) for i, o in serial_overlaps.items()}, \
+        'Parallel overlap discovery differs from the serial loop'
+    assert parallel_block.chunks == serial_block.chunks, 'Parallel overlap discovery picked a different starting block'
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for OverlapCache: cached overlaps give the same results, and the cache is actually hit
+"""
+
+import pytest
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from OverlapCache import OverlapCache
+from WireNgramCombiner import NgramCombiner, MIN_GRAM_LEN
+from benchmarks.synthetic_clusters import generate_cluster
+
+@pytest.fixture
+def set_up_cluster():
+    return generate_cluster(n_articles = 6, article_len = 200, ocr_noise = .02, truncation = .3, junk = .2, seed = 8)
+
+def test_cached_results_match(tmp_path, set_up_cluster):
+    expected = NgramCombiner(set_up_cluster).estimate_text()
+    n_pairs = len(set_up_cluster) * (len(set_up_cluster) - 1) // 2
+
+    with OverlapCache(str(tmp_path / 'overlaps.sqlite'), MIN_GRAM_LEN) as cache:
+        first = NgramCombiner(set_up_cluster, overlap_cache = cache).estimate_text()
+        assert (cache.hits, cache.misses) == (0, n_pairs)
+
+    with OverlapCache(str(tmp_path / 'overlaps.sqlite'), MIN_GRAM_LEN) as cache:
+        second = NgramCombiner(set_up_cluster, overlap_cache = cache).estimate_text()
+        assert (cache.hits, cache.misses) == (n_pairs, 0)
+
+    for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+        assert first[key] == expected[key] and second[key] == expected[key], 'Different {} with the overlap cache'.format(key)
+
+def test_lru_eviction(tmp_path):
+    with OverlapCache(str(tmp_path / 'overlaps.sqlite'), MIN_GRAM_LEN, max_entries = 2) as cache:
+        a, b, c = [cache.sequence_hash([word]) for word in ['a', 'b', 'c']]
+        cache.put_many([((a, b), [(0, 0, 7)]), ((b, c), [])])
+        cache.get_many([(a, b)])
+        cache.put_many([((a, c), [(1, 2, 9)])])
+
+        assert len(cache) == 2
+        assert cache.get_many([(a, b), (b, c), (a, c)]) == [[(0, 0, 7)], None, [(1, 2, 9)]]
+
+        #Replacing an entry doesn't add one
+        cache.put_many([((a, c), [(1, 2, 8)])])
+        assert len(cache) == 2 and cache.get_many([(a, c)]) == [[(1, 2, 8)]]
+
+    with OverlapCache(str(tmp_path / 'overlaps.sqlite'), MIN_GRAM_LEN, max_entries = 2) as cache:
+        assert len(cache) == 2
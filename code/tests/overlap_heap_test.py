@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the overlap heap in NgramCombiner (_pop_longest_unused_overlap), checking it picks
+overlaps in the same order as the old scan over overlap_dict, and that overlaps set aside as covered
+come back once their source's coverage changes
+"""
+
+import math
+import pytest
+import random
+import sys, os
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath('.'))
+from SourceOverlapIndex import SourceOverlapIndex
+from WireNgramCombiner import NgramCombiner
+
+ARTICLE_LEN = 100
+
+def _make_combiner(overlap_lists, stats = False):
+    combiner = NgramCombiner([' '.join(['w'] * ARTICLE_LEN)] * len(overlap_lists), stats = stats)
+    combiner.overlap_dict = {i: SourceOverlapIndex(overlaps) for i, overlaps in enumerate(overlap_lists)}
+    return combiner
+
+def _block(**source_bounds):
+    '''A stand in for a Block, just using the given (min_idx, max_idx) of each source, e.g. s0 = (40, 70)'''
+    source_min_max = {int(source[1:]): {'min_idx': lo, 'max_idx': hi} for source, (lo, hi) in source_bounds.items()}
+    return SimpleNamespace(sources = set(source_min_max), source_min_max = source_min_max)
+
+def _pop(combiner):
+    popped = combiner._pop_longest_unused_overlap()
+    if popped:
+        combiner.overlap_dict[popped[0]].remove(popped[1])
+    return popped
+
+def _linear_longest_unused_overlap(combiner):
+    '''The old scan in estimate_text: the first longest overlap found going over sources, then the gaps in
+        their coverage, then overlap_dict[source]'''
+    longest, max_len = None, 0
+    for i in range(len(combiner.article_set)):
+        coverage = [0]
+        for block in combiner.blocks:
+            if i in block.sources:
+                coverage.extend([block.source_min_max[i]['min_idx'], block.source_min_max[i]['max_idx']])
+        coverage.append(len(combiner.article_set[i]))
+
+        for k in range(int(len(coverage) / 2)):
+            for overlap in combiner.overlap_dict[i]:
+                if overlap[0] > coverage[2 * k] and overlap[0] + overlap[1] < coverage[2 * k + 1] and overlap[1] > max_len:
+                    longest, max_len = (i, overlap), overlap[1]
+    return longest
+
+def test_longest_first_with_ties():
+    combiner = _make_combiner([[(10, 8, 1, 0), (50, 12, 2, 0), (30, 12, 1, 5)],
+                               [(20, 12, 0, 0), (60, 9, 2, 4)],
+                               [(5, 12, 0, 1), (70, 14, 1, 3)]])
+    combiner._build_overlap_heap()
+
+    #Longest first, ties going to the lowest source, then the overlap found first in overlap_dict
+    order = [_pop(combiner) for _ in range(7)]
+    assert order == [(2, (70, 14, 1, 3)), (0, (50, 12, 2, 0)), (0, (30, 12, 1, 5)), (1, (20, 12, 0, 0)),
+                     (2, (5, 12, 0, 1)), (1, (60, 9, 2, 4)), (0, (10, 8, 1, 0))]
+    assert _pop(combiner) is None
+
+def test_ties_prefer_first_gap():
+    #The block leaves source 0 the gaps (0, 40) and (70, 100), so (5, 12) is in the first gap and
+    #comes first, despite being later in overlap_dict
+    combiner = _make_combiner([[(75, 12, 1, 0), (5, 12, 1, 20)], []])
+    combiner.blocks = [_block(s0 = (40, 70))]
+    combiner._build_overlap_heap()
+
+    assert _pop(combiner) == (0, (5, 12, 1, 20))
+    assert _pop(combiner) == (0, (75, 12, 1, 0))
+
+def test_stale_overlap_reinserted():
+    combiner = _make_combiner([[(50, 12, 2, 0), (10, 8, 1, 0)],
+                               [(20, 10, 0, 0)],
+                               [(5, 10, 0, 1)]])
+    combiner.blocks = [_block(s0 = (40, 70))]
+    combiner._build_overlap_heap()
+
+    #(50, 12) is inside the block, so it's set aside rather than picked
+    assert _pop(combiner) == (1, (20, 10, 0, 0))
+    assert combiner.stale_overlaps[0] and combiner.stale_overlaps[0][0][3] == (50, 12, 2, 0)
+
+    #Once source 0's coverage changes it goes back in at its own length, ahead of the shorter overlaps
+    combiner.blocks = [_block(s0 = (65, 90))]
+    combiner._refresh_coverage({0})
+    assert not combiner.stale_overlaps[0]
+    assert _pop(combiner) == (0, (50, 12, 2, 0))
+    assert _pop(combiner) == (2, (5, 10, 0, 1))
+    assert _pop(combiner) == (0, (10, 8, 1, 0))
+    assert _pop(combiner) is None
+
+def test_matches_linear_scan():
+    rng = random.Random(5)
+    for _ in range(50):
+        n_sources = rng.randint(1, 5)
+        overlap_lists = [list({(rng.randint(0, 90), rng.randint(7, 20), rng.randint(0, 4), rng.randint(0, 90))
+                               for _ in range(rng.randint(0, 12))}) for _ in range(n_sources)]
+        combiner = _make_combiner(overlap_lists)
+        combiner._build_overlap_heap()
+
+        while True:
+            expected = _linear_longest_unused_overlap(combiner)
+            assert _pop(combiner) == expected
+            if expected is None:
+                break
+
+            #Grow a block over some of the sources, as building out and merging blocks would
+            lo = rng.randint(0, 60)
+            block = _block(**{'s{}'.format(i): (lo, lo + rng.randint(5, 40)) for i in range(n_sources) if rng.random() < .5})
+            combiner.blocks.append(block)
+            combiner._refresh_coverage(block.sources)
+
+def test_refresh_only_rechecks_new_gaps():
+    #Source 0 has many overlaps, all inside a block, and every new block touches source 0 without uncovering
+    #any of them. They should be set aside once, not pushed back and popped again after every block
+    n_overlaps, n_blocks = 2000, 200
+    rng = random.Random(3)
+    combiner = _make_combiner([[(rng.randint(10, 80), 7 + n % 10, 1, n) for n in range(n_overlaps)]] +
+                              [[(1 + n % 80, 8, 0, n)] for n in range(n_blocks)], stats = True)
+    combiner.blocks = [_block(s0 = (5, 95))]
+    combiner._build_overlap_heap()
+
+    for n in range(n_blocks):
+        assert _pop(combiner)[0] == n + 1
+        block = _block(s0 = (5 + n % 3, 95 - n % 5))
+        combiner.blocks.append(block)
+        combiner._refresh_coverage(block.sources)
+
+    considered = combiner.stats.as_dict()['counts']['overlaps_considered']
+    assert considered <= n_overlaps + n_blocks * math.ceil(math.log2(n_overlaps))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for ResultWriter: streaming results out, resuming after a crash and compacting
+"""
+
+import pytest
+import json
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from ResultWriter import ResultWriter, read_results
+
+def _results(k):
+    return {'n_remaining_blocks': 1, 'blocks': ['text of cluster {}'.format(k)], 'block_coverages': [.5]}
+
+def test_resume_after_crash(tmp_path):
+    outpath = str(tmp_path / 'merged.jsonl')
+    with ResultWriter(outpath, fsync_every = 2) as writer:
+        for k in ['3', '1', '2']:
+            writer.write(k, _results(k))
+
+    #A crash halfway through writing a record
+    with open(outpath, 'a') as outfile:
+        outfile.write('{"cluster_id": "4", "resu')
+
+    with ResultWriter(outpath) as writer:
+        assert writer.done_ids == {'1', '2', '3'}
+        assert '4' not in writer
+        writer.write('4', _results('4'))
+
+    assert read_results(outpath) == {k: _results(k) for k in ['3', '1', '2', '4']}
+
+def test_compact_matches_output_all_format(tmp_path):
+    with ResultWriter(str(tmp_path / 'merged.jsonl')) as writer:
+        for k in ['7', '5']:
+            writer.write(k, _results(k))
+        writer.compact(str(tmp_path / 'merged.json'))
+
+    with open(str(tmp_path / 'merged.json')) as infile:
+        assert json.load(infile) == {k: _results(k) for k in ['7', '5']}
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for SourceOverlapIndex, checking it behaves exactly like the plain overlap list (and the loop
+over it) it replaced in NgramCombiner
+"""
+
+import pytest
+import random
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from SourceOverlapIndex import SourceOverlapIndex
+
+def _linear_pop_straddling(overlaps, min_idx, max_idx):
+    '''The old loop from _build_out_block, removing from the list as it goes'''
+    popped = []
+    for overlap in overlaps:
+        if overlap[0] < min_idx and overlap[0] + overlap[1] > min_idx:
+            popped.append(overlap)
+            overlaps.remove(overlap)
+        elif overlap[0] < max_idx and overlap[0] + overlap[1] > max_idx:
+            popped.append(overlap)
+            overlaps.remove(overlap)
+    return popped
+
+def _random_overlaps(rng, n):
+    overlaps = {(rng.randint(0, 60), rng.randint(7, 25), rng.randint(1, 5), rng.randint(0, 60)) for _ in range(n)}
+    overlaps = sorted(overlaps)
+    rng.shuffle(overlaps)
+    return overlaps
+
+def test_pop_straddling_boundaries():
+    #Overlaps straddle an index only if it is strictly inside them: (10, 10) covers 11..19
+    overlaps = [(10, 10, 1, 0), (0, 10, 1, 5), (20, 5, 2, 0), (5, 15, 2, 3), (9, 2, 3, 0)]
+    index = SourceOverlapIndex(overlaps)
+
+    #(5, 15) straddles 10, and removing it skips (9, 2) until the next pass. Nothing straddles 20
+    assert index.pop_straddling(10, 20) == [(5, 15, 2, 3)]
+    assert index.pop_straddling(10, 19) == [(10, 10, 1, 0), (9, 2, 3, 0)]
+    assert list(index) == [(0, 10, 1, 5), (20, 5, 2, 0)]
+
+def test_pop_straddling_skips_after_removal():
+    #All three straddle 12, but the old loop skipped the one right after each one it removed
+    overlaps = [(10, 8, 1, 0), (11, 8, 2, 0), (5, 9, 3, 0), (0, 4, 4, 0)]
+    index = SourceOverlapIndex(overlaps)
+
+    assert index.pop_straddling(12, 40) == [(10, 8, 1, 0), (5, 9, 3, 0)]
+    assert index.pop_straddling(12, 40) == [(11, 8, 2, 0)]
+    assert index.pop_straddling(12, 40) == []
+
+def test_pop_straddling_matches_linear_scan():
+    rng = random.Random(6)
+    for _ in range(200):
+        overlaps = _random_overlaps(rng, rng.randint(0, 40))
+        index = SourceOverlapIndex(overlaps)
+
+        while True:
+            min_idx = rng.randint(0, 70)
+            max_idx = min_idx + rng.randint(0, 30)
+            popped = _linear_pop_straddling(overlaps, min_idx, max_idx)
+            assert index.pop_straddling(min_idx, max_idx) == popped
+            assert list(index) == overlaps and len(index) == len(overlaps)
+            if not popped:
+                break
+
+def test_remove_and_compaction():
+    rng = random.Random(2)
+    overlaps = _random_overlaps(rng, 30)
+    index = SourceOverlapIndex(overlaps)
+
+    for overlap in rng.sample(overlaps, 25):
+        overlaps.remove(overlap)
+        index.remove(overlap)
+        assert overlap not in index
+        assert list(index) == overlaps and len(index) == len(overlaps)
+        #Dead starts are dropped once they are more than half of the sorted starts
+        assert len(index.starts) <= 2 * len(index) or len(index) == 0
+
+    assert sorted(index.starts) == index.starts
+    alive_starts = [index.overlaps[n][0] for n in index.by_start if index.alive[n]]
+    assert alive_starts == sorted(overlap[0] for overlap in overlaps)
+    assert index.pop_straddling(30, 50) == _linear_pop_straddling(overlaps, 30, 50)
+
+    with pytest.raises(ValueError):
+        index.remove((1000, 7, 1, 0))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Golden tests for text_sanitizer: every variant has to give exactly what the re.sub based sanitizer it
+replaced did (kept below as the reference), on real articles and on random strings of awkward characters
+"""
+
+import pytest
+import json
+import random
+import re
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from text_sanitizer import sanitize, sanitize_all, VARIANTS
+
+CLUSTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'clusters',
+                            'predicted_clusters_May-10-1949.json')
+
+def _legacy_sanitize(text, variant):
+    pattern = re.compile('[^A-Za-z0-9\\s!#\\$%&\\*\\(\\)_\\?\\/\\+-=\\[\\]:;\'",\\.]\\+—')
+    text = pattern.sub('', text)
+
+    text = re.sub('—', '--', text)
+    text = re.sub('[“”‘]', '"', text)
+    text = re.sub('’', '\'', text)
+    if variant == 'gpt_training':
+        text = re.sub(' \\. ', '\\. ', text)
+    else:
+        text = re.sub(' \\. ', ' \\.', text)
+    text = re.sub(' , ', ', ', text)
+    text = re.sub(' \' ', '\'', text)
+    text = re.sub('\\|', '', text)
+    text = re.sub('\\"', '\'', text)
+    text = re.sub('\\s+', ' ', text)
+    text = re.sub('- ', '', text)
+    if variant == 'aligning':
+        text = re.sub(r'(\.)([^ ])', r'\1 \2', text)
+        return re.sub(r'[^A-Za-z0-9\.\-,\s+]', '', text).strip()
+    elif variant == 'gpt_training':
+        return re.sub(r'[^A-Za-z0-9\.,\s+]', '', text).strip()
+    return re.sub(r'[^A-Za-z0-9\.\-,\s+]', '', text).strip()
+
+@pytest.fixture(scope = 'module')
+def articles():
+    with open(CLUSTER_FILE, 'r') as infile:
+        data = json.load(infile)
+    return [text for cluster in data.values() for text in cluster.values()]
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_matches_legacy_on_articles(articles, variant):
+    assert sanitize_all(articles, variant) == [_legacy_sanitize(text, variant) for text in articles]
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_matches_legacy_on_random_text(variant):
+    rng = random.Random(2)
+    alphabet = list(' .,\'"|-+\\#a1Z\n\t\xa0\x1c é') + ['—', '“', '”', '‘', '’', ' . ', ' , ', ' \' ']
+    for _ in range(3000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert sanitize(text, variant) == _legacy_sanitize(text, variant), repr(text)
+
+def test_bad_variant():
+    with pytest.raises(ValueError):
+        sanitize('text', 'ocr')
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for token_matching, checked against difflib.SequenceMatcher
+"""
+
+import pytest
+import random
+import sys, os
+from difflib import SequenceMatcher
+import numpy as np
+
+sys.path.append(os.path.abspath('.'))
+import token_matching
+from token_matching import longest_match, matching_blocks, first_match, longest_match_at_least
+
+def _noisy_pair(rng, length, vocab_size):
+    a = [rng.randrange(vocab_size) for _ in range(length)]
+    b = list(a)
+    for _ in range(rng.randrange(1, 6)):
+        b[rng.randrange(length)] = rng.randrange(vocab_size)
+    cut = rng.randrange(length // 2)
+    return np.array(a, dtype = np.int32), np.array(b[cut:] + a[:cut], dtype = np.int32)
+
+#Lengths either side of VECTORIZE_MIN_LEN, and small vocabularies to force ties between equally long matches
+@pytest.mark.parametrize('length', [2, 5, 20, 60, 150])
+@pytest.mark.parametrize('vocab_size', [3, 50])
+def test_same_as_sequence_matcher(length, vocab_size):
+    rng = random.Random(length * vocab_size)
+    for _ in range(20):
+        a, b = _noisy_pair(rng, length, vocab_size)
+        matcher = SequenceMatcher(a = a.tolist(), b = b.tolist(), autojunk = False)
+        alo, ahi = sorted(rng.randrange(length + 1) for _ in range(2))
+        blo, bhi = sorted(rng.randrange(length + 1) for _ in range(2))
+
+        assert longest_match(a, b) == tuple(matcher.find_longest_match(0, len(a), 0, len(b)))
+        assert longest_match(a, b, alo, ahi, blo, bhi) == tuple(matcher.find_longest_match(alo, ahi, blo, bhi))
+        assert matching_blocks(a, b) == [tuple(x) for x in matcher.get_matching_blocks()]
+        assert first_match(a, b) == tuple(sorted(matcher.get_matching_blocks(), key = lambda x: (x[1], -x[2]))[0])
+
+def test_word_lists():
+    a = 'the cat sat on the mat and the cat sat down'.split()
+    b = 'a dog sat on the mat and the cat sat'.split()
+    matcher = SequenceMatcher(a = a, b = b, autojunk = False)
+    assert longest_match(a, b) == tuple(matcher.find_longest_match(0, len(a), 0, len(b)))
+    assert matching_blocks(a, b) == [tuple(x) for x in matcher.get_matching_blocks()]
+
+def test_no_match():
+    assert longest_match([1, 2, 3], [4, 5], 1, 3, 1, 2) == (1, 1, 0)
+    assert first_match([1, 2, 3], [4, 5]) == (3, 2, 0)
+
+#Past GRAM_SEARCH_MIN_LEN
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_at_least_same_as_sequence_matcher(seed):
+    rng = random.Random(seed)
+    for min_size in (4, 30, 2000):
+        a, b = _noisy_pair(rng, 1200, 40)
+        b = np.concatenate((b[400:], a[:100], b[:400]))
+        matcher = SequenceMatcher(a = a.tolist(), b = b.tolist(), autojunk = False)
+        expected = tuple(matcher.find_longest_match(0, len(a), 0, len(b)))
+
+        assert longest_match_at_least(a, b, min_size) == (expected if expected[2] >= min_size else None)
+
+def test_at_least_survives_hash_collisions(monkeypatch):
+    rng = random.Random(2)
+    a, b = _noisy_pair(rng, 800, 40)
+    expected = longest_match(a, b)
+
+    monkeypatch.setattr(token_matching, '_gram_hashes', lambda tokens, size: np.zeros(len(tokens) - size + 1, dtype = np.uint64))
+    assert longest_match_at_least(a, b, 4) == expected
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for TokenizedCorpus
+"""
+
+import pytest
+import sys, os
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath('.'))
+from TokenizedCorpus import TokenizedCorpus
+
+class CharTokenizer:
+    '''One token per character, enough to check the layout'''
+
+    name_or_path = 'chars'
+
+    def __call__(self, texts):
+        return {'input_ids': [[ord(c) for c in text] for text in texts]}
+
+def _decode(tokens):
+    return ''.join(chr(t) for t in tokens)
+
+def test_build_and_views(tmp_path):
+    frame = pd.DataFrame([('a', 1, 'one'), ('a', 2, 'two'), ('b', 3, 'three')], columns = ['cluster_id', 'article_id', 'text'])
+    TokenizedCorpus.build(str(tmp_path), frame, CharTokenizer(), max_len = 4)
+    tokenized = TokenizedCorpus(str(tmp_path))
+
+    assert len(tokenized) == 2 and 'a' in tokenized and 'c' not in tokenized
+    assert tokenized.tokenizer_name == 'chars'
+    assert [_decode(s) for s in tokenized.cluster_sequences('a')] == ['<|a|>one<|endoftext|>', '<|a|>two<|endoftext|>']
+    assert [_decode(s) for s in tokenized.cluster_sequences('b')] == ['<|b|>thre<|endoftext|>']
+    assert np.shares_memory(tokenized.cluster_sequences('b')[0], tokenized.tokens)
+
+def test_clusters_must_be_together(tmp_path):
+    frame = pd.DataFrame([('a', 1, 'x'), ('b', 2, 'y'), ('a', 3, 'z')], columns = ['cluster_id', 'article_id', 'text'])
+    with pytest.raises(ValueError):
+        TokenizedCorpus.build(str(tmp_path), frame, CharTokenizer())
+
+def test_matches(tmp_path):
+    frame = pd.DataFrame([('a', 1, 'one'), ('b', 2, 'two')], columns = ['cluster_id', 'article_id', 'text'])
+    TokenizedCorpus.build(str(tmp_path), frame, CharTokenizer())
+    tokenized = TokenizedCorpus(str(tmp_path))
+
+    assert tokenized.matches(frame, CharTokenizer())
+    #Same cluster ids, another day's text
+    other_day = pd.DataFrame([('a', 1, 'one'), ('b', 2, 'six')], columns = ['cluster_id', 'article_id', 'text'])
+    assert not tokenized.matches(other_day, CharTokenizer())
+
+    other_tokenizer = CharTokenizer()
+    other_tokenizer.name_or_path = 'other'
+    assert not tokenized.matches(frame, other_tokenizer)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for WeightSnapshot
+"""
+
+import pytest
+import sys, os
+
+torch = pytest.importorskip('torch')
+
+sys.path.append(os.path.abspath('.'))
+from WeightSnapshot import WeightSnapshot, reset_optimizer
+
+def test_restore_in_place_and_reset_optimizer():
+    model = torch.nn.Sequential(torch.nn.Linear(3, 3), torch.nn.BatchNorm1d(3))
+    snapshot = WeightSnapshot(model)
+    base = {name: tensor.clone() for name, tensor in model.state_dict().items()}
+    weight = model[0].weight
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr = .1)
+    model(torch.randn(4, 3)).sum().backward()
+    optimizer.step()
+    assert not torch.equal(model[0].weight, base['0.weight'])
+
+    snapshot.restore()
+    assert model[0].weight is weight
+    for name, tensor in model.state_dict().items():
+        assert torch.equal(tensor, base[name]), name
+
+    reset_optimizer(optimizer)
+    for state in optimizer.state.values():
+        assert all(float(value.abs().sum() if torch.is_tensor(value) else value) == 0 for value in state.values())
+
+def test_tied_weights_kept_once():
+    model = torch.nn.Sequential(torch.nn.Embedding(5, 3), torch.nn.Linear(3, 5, bias = False))
+    model[1].weight = model[0].weight
+    snapshot = WeightSnapshot(model)
+    base = model[0].weight.clone()
+
+    assert list(snapshot.state.keys()) == ['0.weight']
+    with torch.no_grad():
+        model[1].weight.add_(1)
+    snapshot.restore()
+    assert torch.equal(model[0].weight, base) and model[1].weight is model[0].weight
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the incremental wire cluster reader, checking it reads exactly what json.load does
+"""
+
+import pytest
+import json
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from wire_cluster_reader import iter_wire_clusters
+
+CLUSTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'clusters',
+                            'predicted_clusters_May-10-1949.json')
+
+@pytest.mark.parametrize('read_size', [7, 4096, 1 << 20])
+def test_reader_matches_json_load(read_size):
+    with open(CLUSTER_FILE, 'r') as infile:
+        expected = json.load(infile)
+
+    clusters = list(iter_wire_clusters(CLUSTER_FILE, read_size = read_size))
+    assert [k for k, _ in clusters] == list(expected.keys()), 'Clusters read in a different order'
+    assert dict(clusters) == expected, 'Clusters read differently than json.load'
+
+@pytest.mark.parametrize('text, expected', [('{}', []), (' {"1": {"a": "x y"}, "2" :{}}\n', [('1', {'a': 'x y'}), ('2', {})])])
+def test_reader_small_files(tmp_path, text, expected):
+    path = tmp_path / 'clusters.json'
+    path.write_text(text)
+    assert list(iter_wire_clusters(str(path), read_size = 3)) == expected
+
+@pytest.mark.parametrize('text', ['', '{"1": {}', '{"1": {}} {}', '[{"1": {}}]', '{"1" {}}'])
+def test_reader_malformed_files(tmp_path, text):
+    path = tmp_path / 'clusters.json'
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_wire_clusters(str(path), read_size = 3))
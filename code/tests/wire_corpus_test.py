@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for WireCorpus, checking both the aligning article sets and the GPT training data come out as
+they did when each was read from the file separately
+"""
+
+import pytest
+import json
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+from WireCorpus import WireCorpus, MAX_GPT_LEN
+from text_sanitizer import sanitize
+
+CLUSTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'clusters',
+                            'predicted_clusters_Jun-22-1973.txt')
+
+@pytest.fixture(scope = 'module')
+def set_up_corpus():
+    with open(CLUSTER_FILE, 'r') as infile:
+        data = json.load(infile)
+    return data, WireCorpus(CLUSTER_FILE)
+
+def test_article_sets(set_up_corpus):
+    data, corpus = set_up_corpus
+    assert corpus.cluster_ids() == list(data.keys())
+    assert corpus.article_sets('aligning') == {k: [sanitize(text) for text in articles.values()] for k, articles in data.items()}
+
+def test_training_frame(set_up_corpus):
+    data, corpus = set_up_corpus
+
+    rows = []
+    for k, articles in data.items():
+        for article_id, text in articles.items():
+            text = sanitize(text, 'gpt_training')
+            if text.count(' ') > MAX_GPT_LEN:
+                text = ' '.join(text.split()[:MAX_GPT_LEN])
+            rows.append((k, article_id, text))
+
+    df = corpus.training_frame()
+    assert list(df.itertuples(index = False, name = None)) == rows
+
+    k = corpus.cluster_ids()[3]
+    cluster_df = corpus.training_frame([k])
+    assert list(cluster_df.itertuples(index = False, name = None)) == [row for row in rows if row[0] == k]
+
+def test_missing_variant(set_up_corpus):
+    with pytest.raises(ValueError):
+        WireCorpus(CLUSTER_FILE, variants = ('aligning',)).training_frame()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for WireFileCombiner's rule based path: it must not load the neural dependencies, and
+streaming the file (lazy mode) or merging over a process pool must give the same results as loading it up
+front and merging serially. With torch and transformers installed, neural_completions' independent fine
+tune modes (restore_base and the adapters) are also run end to end on tiny_lm (see conftest.py)
+"""
+
+import pytest
+import json
+import subprocess
+import sys, os
+
+sys.path.append(os.path.abspath('.'))
+
+CLUSTER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'clusters',
+                            'predicted_clusters_Jun-22-1973.txt')
+
+def test_no_neural_imports():
+    code = 'import sys; import WireFileCombiner; print([m for m in ("torch", "transformers", "pandas") if m in sys.modules])'
+    output = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True).stdout
+    assert output.strip() == '[]', 'Importing WireFileCombiner loaded {}'.format(output.strip())
+
+def test_lazy_matches_eager(tmp_path):
+    from WireFileCombiner import WireFileCombiner
+
+    with open(CLUSTER_FILE, 'r') as infile:
+        small = {k: v for k, v in json.load(infile).items() if len(v) <= 4}
+    filepath = str(tmp_path / 'clusters.json')
+    with open(filepath, 'w') as outfile:
+        json.dump(small, outfile)
+
+    eager, lazy = WireFileCombiner(filepath), WireFileCombiner(filepath, lazy = True)
+    eager.merge_texts()
+    lazy.merge_texts()
+
+    assert not lazy.article_sets
+    assert list(lazy.merged_texts.keys()) == list(eager.merged_texts.keys()) == list(small.keys())
+    for k in small.keys():
+        assert lazy.merged_texts[k]['blocks'] == eager.merged_texts[k]['blocks']
+
+@pytest.fixture
+def small_cluster_file(tmp_path):
+    with open(CLUSTER_FILE, 'r') as infile:
+        small = {k: v for k, v in json.load(infile).items() if len(v) <= 4}
+    #An empty cluster can't be merged (NgramCombiner has no articles to average over)
+    clusters = dict(list(small.items())[:3] + [('bad', {})] + list(small.items())[3:])
+    filepath = str(tmp_path / 'clusters.json')
+    with open(filepath, 'w') as outfile:
+        json.dump(clusters, outfile)
+    return filepath, [k for k in clusters.keys() if k != 'bad']
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_parallel_matches_serial(small_cluster_file, lazy):
+    from WireFileCombiner import WireFileCombiner
+
+    filepath, good_ids = small_cluster_file
+    serial, parallel = WireFileCombiner(filepath, lazy = lazy), WireFileCombiner(filepath, lazy = lazy)
+    serial.merge_texts()
+    parallel.merge_texts(n_workers = 2)
+
+    assert list(parallel.merged_texts.keys()) == list(serial.merged_texts.keys()) == good_ids
+    for k in good_ids:
+        for key in ('n_remaining_blocks', 'blocks', 'block_coverages'):
+            assert parallel.merged_texts[k][key] == serial.merged_texts[k][key]
+
+    #The failing cluster is recorded rather than stopping the run
+    assert list(parallel.merge_errors.keys()) == list(serial.merge_errors.keys()) == ['bad']
+    assert 'ZeroDivisionError' in parallel.merge_errors['bad']
+
+def test_overlap_cache_counts(small_cluster_file, tmp_path):
+    from WireFileCombiner import WireFileCombiner
+
+    filepath, good_ids = small_cluster_file
+    cache_path = str(tmp_path / 'overlaps.sqlite')
+    first, second = WireFileCombiner(filepath, overlap_cache_path = cache_path), WireFileCombiner(filepath, overlap_cache_path = cache_path)
+    first.merge_texts()
+    second.merge_texts()
+
+    #Every pair is aligned on the first run, and found in the cache on the second
+    for k in good_ids:
+        n_pairs = len(first.article_sets[k]) * (len(first.article_sets[k]) - 1) // 2
+        assert first.merged_texts[k]['overlap_cache'] == {'hits': 0, 'misses': n_pairs}
+        assert second.merged_texts[k]['overlap_cache'] == {'hits': n_pairs, 'misses': 0}
+        assert second.merged_texts[k]['blocks'] == first.merged_texts[k]['blocks']
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_training_corpus_sanitized_on_first_use(small_cluster_file, lazy):
+    from WireCorpus import WireCorpus
+    from WireFileCombiner import WireFileCombiner
+
+    filepath, _ = small_cluster_file
+    combiner = WireFileCombiner(filepath, lazy = lazy)
+    combiner.merge_texts()
+
+    #Merging never sanitizes for GPT training
+    assert combiner._training_corpus is None
+    assert combiner.corpus is None or combiner.corpus.variants == ('aligning',)
+
+    training_corpus = combiner.training_corpus
+    assert training_corpus is combiner.training_corpus
+    assert training_corpus.variants == ('gpt_training',)
+    assert combiner.training_format_data.equals(WireCorpus(filepath).training_frame())
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_load_merges(small_cluster_file, tmp_path, lazy):
+    from WireFileCombiner import WireFileCombiner
+
+    filepath, good_ids = small_cluster_file
+    merged = WireFileCombiner(filepath)
+    merged.merge_texts()
+    merge_path = str(tmp_path / 'merges.json')
+    merged.output_all(merge_path)
+
+    loaded = WireFileCombiner(filepath, lazy = lazy)
+    loaded.load_merges(merge_path)
+
+    #Every cluster in the file, with the one that failed to merge left empty
+    assert list(loaded.merged_texts.keys()) == good_ids[:3] + ['bad'] + good_ids[3:]
+    assert loaded.merged_texts['bad'] == {}
+    for k in good_ids:
+        assert loaded.merged_texts[k]['blocks'] == merged.merged_texts[k]['blocks']
+
+def test_batch_across_clusters_needs_cumulative_fine_tuning():
+    from WireFileCombiner import WireFileCombiner
+
+    combiner = WireFileCombiner(None)
+    with pytest.raises(ValueError):
+        combiner.neural_completions(restore_base = True, batch_across_clusters = True)
+    with pytest.raises(ValueError):
+        combiner.neural_completions(adapter_mode = 'bias', batch_across_clusters = True)
+
+@pytest.fixture
+def merged_small_file(small_cluster_file):
+    '''A WireFileCombiner over three of the small clusters, already merged'''
+    from WireFileCombiner import WireFileCombiner
+
+    filepath, good_ids = small_cluster_file
+    with open(filepath, 'r') as infile:
+        clusters = json.load(infile)
+    with open(filepath, 'w') as outfile:
+        json.dump({k: clusters[k] for k in good_ids[:3]}, outfile)
+
+    combiner = WireFileCombiner(filepath)
+    combiner.merge_texts()
+    return combiner, good_ids[:3]
+
+def _state(model):
+    return {name: tensor.detach().clone() for name, tensor in model.state_dict().items()}
+
+def _tensors_equal(x, y):
+    import torch
+    return torch.equal(x, y)
+
+def _same_state(model, state):
+    return all(_tensors_equal(tensor, state[name]) for name, tensor in model.state_dict().items())
+
+@pytest.mark.parametrize('batch_size', [None, 2])
+def test_neural_completions_restore_base(merged_small_file, tiny_lm_path, monkeypatch, batch_size):
+    from transformers import AutoModelForCausalLM
+    from WireFileCombiner import WireFileCombiner
+
+    combiner, ids = merged_small_file
+    base = _state(AutoModelForCausalLM.from_pretrained(tiny_lm_path))
+
+    #Every cluster's fine tune starts from the base weights
+    restored = []
+    restore_base = WireFileCombiner._restore_base
+    def checked_restore(self):
+        restore_base(self)
+        restored.append(_same_state(self.model, base))
+    monkeypatch.setattr(WireFileCombiner, '_restore_base', checked_restore)
+
+    combiner.neural_completions(tiny_lm_path, batch_size = batch_size, restore_base = True)
+    assert restored == [True] * len(ids)
+    assert not _same_state(combiner.model, base), 'The fine tunes did not train anything'
+    assert all(isinstance(combiner.merged_texts[k]['n_text'], str) for k in ids)
+
+@pytest.mark.parametrize('adapter_mode,batch_size', [('bias', None), ('last_layer', 2)])
+def test_neural_completions_adapter(merged_small_file, tiny_lm_path, tmp_path, monkeypatch, adapter_mode, batch_size):
+    from transformers import AutoModelForCausalLM
+    from GptFineTuner import GptFineTuner
+
+    combiner, ids = merged_small_file
+    base = _state(AutoModelForCausalLM.from_pretrained(tiny_lm_path))
+    cache_dir = str(tmp_path / 'adapters')
+
+    combiner.neural_completions(tiny_lm_path, batch_size = batch_size, adapter_mode = adapter_mode, adapter_cache_dir = cache_dir)
+    n_texts = {k: combiner.merged_texts[k]['n_text'] for k in ids}
+    assert all(isinstance(text, str) for text in n_texts.values())
+
+    #Only the adapter's parameters were trained, and every cluster's delta got cached
+    trained = set(combiner.adapter.names)
+    for name, tensor in combiner.model.state_dict().items():
+        if name not in trained:
+            assert _tensors_equal(tensor, base[name]), name
+    assert any(not _tensors_equal(combiner.model.state_dict()[name], base[name]) for name in trained)
+    assert len(os.listdir(cache_dir)) == len(ids)
+
+    #A rerun takes every cluster's adapter from the cache, without fine tuning anything
+    def no_fine_tune(*args, **kwargs):
+        raise AssertionError('Fine tuned a cached cluster')
+    monkeypatch.setattr(GptFineTuner, 'fine_tune', no_fine_tune)
+    combiner.neural_completions(tiny_lm_path, batch_size = batch_size, adapter_mode = adapter_mode, adapter_cache_dir = cache_dir)
+    assert {k: combiner.merged_texts[k]['n_text'] for k in ids} == n_texts
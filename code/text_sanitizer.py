@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Article text cleaning, shared by everything that reads wire cluster articles. There are three variants,
+which give exactly what the separate sanitizers each used to:
+
+    'aligning'      - WireFileCombiner.sanitize_before_aligning, used before the rule based merging
+    'gpt_training'  - create_wire_cluster_training_data.sanitize_text, used for the GPT training data
+    'training_text' - the sanitizer in generate_cluster_training_data
+
+All three: drop a few odd '<char>+—' sequences, normalize dashes and quotes, tidy spacing around
+periods, commas and apostrophes, drop bars, collapse whitespace, join words hyphen-split across lines,
+(aligning only: make sure a period is followed by a space,) and finally drop every character not
+alphanumeric, a period, comma or space (aligning/training_text also keep hyphens).
+
+Rather than ~14 re.sub passes, each re-parsing its regex, literal replacements are done with
+str.replace (which is much faster than str.translate on the non-ASCII strings OCR text tends to be),
+whitespace is collapsed with str.split, the final character filter is a single bytes.translate over
+the ASCII text, and only the few steps that really need a regex use (precompiled) ones. The order of
+the steps is kept, as several of them interact (e.g. ' . ' is only tidied if the spaces were there
+before whitespace is collapsed).
+"""
+
+import re
+
+VARIANTS = ('aligning', 'gpt_training', 'training_text')
+
+_ODD_DASH_PATTERN = re.compile('[^A-Za-z0-9\\s!#\\$%&\\*\\(\\)_\\?\\/\\+-=\\[\\]:;\'",\\.]\\+—')
+_PERIOD_PATTERN = re.compile(r'(\.)([^ ])')
+
+#Em dash to double hyphen, curly quotes to straight quote, right single quote to apostrophe
+_QUOTE_REPLACEMENTS = [('—', '--'), ('“', '"'), ('”', '"'), ('‘', '"'), ('’', '\'')]
+
+#By the last step all whitespace is single spaces, so everything else allowed is ASCII
+_ALLOWED = {
+    'aligning': set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.-, +'),
+    'gpt_training': set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789., +'),
+}
+_ALLOWED['training_text'] = _ALLOWED['aligning']
+_DELETE = {variant: bytes(c for c in range(128) if chr(c) not in allowed) for variant, allowed in _ALLOWED.items()}
+
+#What ' . ' gets replaced with. The old re.sub replacements left the backslash in, it's dropped at the end
+_SPACED_PERIOD = {'aligning': ' \\.', 'gpt_training': '\\. ', 'training_text': ' \\.'}
+
+
+def sanitize(text, variant = 'aligning'):
+    if variant not in VARIANTS:
+        raise ValueError('Unknown sanitizer variant {}! Must be one of {}'.format(variant, ', '.join(VARIANTS)))
+
+    if '+—' in text:
+        text = _ODD_DASH_PATTERN.sub('', text)
+    for old, new in _QUOTE_REPLACEMENTS:
+        text = text.replace(old, new)
+    text = text.replace(' . ', _SPACED_PERIOD[variant])
+    text = text.replace(' , ', ', ')
+    text = text.replace(' \' ', '\'')
+    text = text.replace('|', '').replace('"', '\'')
+    text = _collapse_whitespace(text)
+    text = text.replace('- ', '')
+    if variant == 'aligning':
+        text = _PERIOD_PATTERN.sub(r'\1 \2', text)
+
+    return text.encode('ascii', 'ignore').translate(None, _DELETE[variant]).decode('ascii').strip()
+
+'''Replaces any run of whitespace with a single space, just as re.sub('\\s+', ' ', text) would'''
+def _collapse_whitespace(text):
+    words = text.split()
+    collapsed = ' '.join(words)
+    if text[:1].isspace():
+        collapsed = ' ' + collapsed
+    if words and text[-1:].isspace():
+        collapsed = collapsed + ' '
+    return collapsed
+
+'''Sanitizes a list of articles'''
+def sanitize_all(texts, variant = 'aligning'):
+    return [sanitize(text, variant) for text in texts]
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Exact token sequence matching for Block (the short windows check_overlap compares, and whole Block texts
+in merge_block), as a lighter stand-in for difflib.SequenceMatcher with autojunk = False and no junk (the only way Block uses it).
+
+    longest_match(a, b, alo, ahi, blo, bhi)  - same (i, j, size) as SequenceMatcher.find_longest_match
+    matching_blocks(a, b)                    - same list of (i, j, size) as SequenceMatcher.get_matching_blocks
+    first_match(a, b)                        - the matching block starting earliest in b, longest first on ties
+    longest_match_at_least(a, b, min_size)   - longest_match(a, b) if it is at least min_size long, else None
+
+This is the same dynamic program SequenceMatcher runs (a dict of where each token sits in b, and for each
+token of a the length of the match ending at each of those positions), so the results, including which
+of several equally long matches wins, are identical. What it drops is everything a window this short
+never needs: the SequenceMatcher object and its caches, the junk and popular token bookkeeping, the
+Match namedtuples, and a full sort just to take one block. Token ids are turned into plain ints first,
+as NumPy scalars hash far more slowly. Ranges longer than VECTORIZE_MIN_LEN tokens are searched with a
+NumPy version of the same search instead (see _longest_match_vectorized). Whole Block texts, where only a
+match longer than a threshold matters, are searched by gram hashes (see longest_match_at_least).
+"""
+
+import numpy as np
+
+VECTORIZE_MIN_LEN = 32 #Past how many tokens (in the shorter of the two windows) does longest_match switch to NumPy?
+GRAM_SEARCH_MIN_LEN = 512 #Past how many tokens does longest_match_at_least search by gram hashes?
+GRAM_HASH_BASE = np.uint64(0x9E3779B97F4A7C15) #Odd, so it has an inverse mod 2**64
+_GRAM_HASH_INVERSE = np.uint64(pow(int(GRAM_HASH_BASE), -1, 2 ** 64))
+
+
+def _as_list(tokens):
+    return tokens.tolist() if hasattr(tokens, 'tolist') else tokens
+
+'''Dict of token -> ascending list of its positions in b'''
+def _positions(b):
+    b2j = {}
+    for j, token in enumerate(b):
+        indices = b2j.get(token)
+        if indices is None:
+            b2j[token] = [j]
+        else:
+            indices.append(j)
+    return b2j
+
+def _longest_match(a, b2j, alo, ahi, blo, bhi):
+    besti, bestj, bestsize = alo, blo, 0
+    j2len = {}
+    for i in range(alo, ahi):
+        j2lenget = j2len.get
+        newj2len = {}
+        for j in b2j.get(a[i], ()):
+            if j < blo:
+                continue
+            if j >= bhi:
+                break
+            k = newj2len[j] = j2lenget(j - 1, 0) + 1
+            if k > bestsize:
+                besti, bestj, bestsize = i - k + 1, j - k + 1, k
+        j2len = newj2len
+    return besti, bestj, bestsize
+
+'''The same, vectorized: every (i, j) with a[i] == b[j] is listed at once (via b sorted), numbered by
+    (diagonal, i) so the matches along a run on a diagonal get consecutive numbers, and the runs read off
+    those numbers. Worth its fixed cost once a window is more than a few dozen tokens'''
+def _longest_match_vectorized(a, b, alo, ahi, blo, bhi):
+    sub_a, sub_b = np.asarray(a[alo:ahi]), np.asarray(b[blo:bhi])
+    n = len(sub_a)
+    if n == 0 or len(sub_b) == 0:
+        return alo, blo, 0
+
+    order = np.argsort(sub_b, kind = 'stable')
+    sorted_b = sub_b[order]
+    lo = np.searchsorted(sorted_b, sub_a, 'left')
+    counts = np.searchsorted(sorted_b, sub_a, 'right') - lo
+    total = int(counts.sum())
+    if total == 0:
+        return alo, blo, 0
+
+    rows = np.repeat(np.arange(n), counts)
+    firsts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    cols = order[firsts + np.arange(total)]
+
+    keys = np.sort((cols - rows + n) * (n + 1) + rows)
+    breaks = np.flatnonzero(np.diff(keys) != 1)
+    run_starts = np.concatenate(([0], breaks + 1))
+    run_sizes = np.concatenate((breaks, [total - 1])) - run_starts + 1
+
+    size = run_sizes.max()
+    starts = keys[run_starts[run_sizes == size]]
+    i = starts % (n + 1)
+    j = starts // (n + 1) - n + i
+    best = np.lexsort((j, i))[0]
+    return alo + int(i[best]), blo + int(j[best]), int(size)
+
+class _Matcher:
+
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+        self.list_a = self.b2j = None
+
+    def longest_match(self, alo, ahi, blo, bhi):
+        if min(ahi - alo, bhi - blo) > VECTORIZE_MIN_LEN:
+            return _longest_match_vectorized(self.a, self.b, alo, ahi, blo, bhi)
+        if self.b2j is None:
+            self.list_a, self.b2j = _as_list(self.a), _positions(_as_list(self.b))
+        return _longest_match(self.list_a, self.b2j, alo, ahi, blo, bhi)
+
+def longest_match(a, b, alo = 0, ahi = None, blo = 0, bhi = None):
+    ahi = len(a) if ahi is None else ahi
+    bhi = len(b) if bhi is None else bhi
+    return _Matcher(a, b).longest_match(alo, ahi, blo, bhi)
+
+def matching_blocks(a, b):
+    matcher = _Matcher(a, b)
+    la, lb = len(a), len(b)
+
+    queue = [(0, la, 0, lb)]
+    blocks = []
+    while queue:
+        alo, ahi, blo, bhi = queue.pop()
+        i, j, k = match = matcher.longest_match(alo, ahi, blo, bhi)
+        if k:
+            blocks.append(match)
+            if alo < i and blo < j:
+                queue.append((alo, i, blo, j))
+            if i + k < ahi and j + k < bhi:
+                queue.append((i + k, ahi, j + k, bhi))
+    blocks.sort()
+
+    #Adjacent blocks are joined, as SequenceMatcher does
+    i1 = j1 = k1 = 0
+    non_adjacent = []
+    for i2, j2, k2 in blocks:
+        if i1 + k1 == i2 and j1 + k1 == j2:
+            k1 += k2
+        else:
+            if k1:
+                non_adjacent.append((i1, j1, k1))
+            i1, j1, k1 = i2, j2, k2
+    if k1:
+        non_adjacent.append((i1, j1, k1))
+
+    non_adjacent.append((la, lb, 0))
+    return non_adjacent
+
+'''The first of sorted(matching_blocks(a, b), key = lambda x: (x[1], -x[2])). Matching blocks never cross,
+    so that is simply the first block (or the (len(a), len(b), 0) sentinel if nothing matches)'''
+def first_match(a, b):
+    return matching_blocks(a, b)[0]
+
+'''Hash of every size-gram of tokens (a polynomial hash mod 2**64, so equal grams always hash alike but
+    different grams occasionally might too)'''
+def _gram_hashes(tokens, size):
+    tokens = np.asarray(tokens).astype(np.uint64)
+    powers = np.cumprod(np.full(len(tokens), GRAM_HASH_BASE, dtype = np.uint64))
+    inverse_powers = np.cumprod(np.full(len(tokens) - size + 1, _GRAM_HASH_INVERSE, dtype = np.uint64))
+    prefix = np.concatenate((np.zeros(1, dtype = np.uint64), np.cumsum(tokens * powers, dtype = np.uint64)))
+    return (prefix[size:] - prefix[:len(tokens) - size + 1]) * inverse_powers
+
+'''The same (i, j, size) as longest_match(a, b), if that match is at least min_size tokens long, else None.
+
+    Every match that long is a run of consecutive min_size-grams shared by a and b along one diagonal, so
+    for long sequences this looks for the longest run of equal gram hashes instead, which only has to pair
+    up positions whose whole min_size-grams agree rather than every pair of equal tokens. The winning run is
+    checked against the tokens, so a hash collision just means falling back to longest_match'''
+def longest_match_at_least(a, b, min_size):
+    if min(len(a), len(b)) < min_size:
+        return None
+    if min(len(a), len(b)) <= GRAM_SEARCH_MIN_LEN or not (isinstance(a, np.ndarray) and isinstance(b, np.ndarray)):
+        match = longest_match(a, b)
+        return match if match[2] >= min_size else None
+
+    i, j, runs = _longest_match_vectorized(_gram_hashes(a, min_size), _gram_hashes(b, min_size),
+                                           0, len(a) - min_size + 1, 0, len(b) - min_size + 1)
+    if runs == 0:
+        return None
+    size = runs + min_size - 1
+    if np.array_equal(a[i:i + size], b[j:j + size]):
+        return i, j, size
+
+    match = longest_match(a, b)
+    return match if match[2] >= min_size else None
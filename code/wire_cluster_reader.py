@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental reader for wire cluster files. Files are jsons in the format:
+
+    { "<wire_cluster_1_id>": { "<cluster_1_article_1_id": "<cluster_1_article_1_text>",
+                               "<cluster_1_article_2_id": "<cluster_1_article_2_text",
+                               ...   },
+      "<wire_cluster_2_id": { "<cluster_2_article_1_id": "<cluster_2_article_1_text",
+                             ...     },
+      ....
+  }
+
+Rather than json.load-ing the whole file, iter_wire_clusters reads it a piece at a time and yields
+one (cluster_id, articles) pair as soon as that cluster has been read, so only one cluster (plus
+a read buffer) is ever held in memory, and the first clusters can be processed before the rest of
+the file has even been read. Gives exactly the same clusters, in the same order, as json.load.
+"""
+
+import json
+
+READ_SIZE = 1 << 20 #How many characters are read from the file at a time?
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _ClusterStream:
+
+    def __init__(self, infile, read_size):
+        self.infile = infile
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    '''Reads more of the file into the buffer (dropping what's already been parsed). Reads at least as much as
+        is still buffered, so a value spanning many reads isn't re-parsed from its start too many times'''
+    def _read_more(self):
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        new_text = self.infile.read(max(self.read_size, len(self.buffer)))
+        if not new_text:
+            self.eof = True
+        self.buffer += new_text
+
+    '''Returns the next character that isn't whitespace (without consuming it), or None at the end of the file'''
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return None
+            self._read_more()
+
+    def expect(self, chars):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise json.JSONDecodeError('Expecting one of {!r}'.format(chars), self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    '''Decodes the next json value. A value running up to the end of the buffer may be cut short (a truncated
+        number still decodes), so unless the file is done, that means reading more and trying again'''
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+
+'''Yields (cluster_id, {article_id: text}) for each cluster in the file, in file order'''
+def iter_wire_clusters(filepath, read_size = READ_SIZE):
+    with open(filepath, 'r') as infile:
+        stream = _ClusterStream(infile, read_size)
+
+        stream.expect('{')
+        if stream.peek() == '}':
+            stream.expect('}')
+        else:
+            while True:
+                cluster_id = stream.value()
+                if not isinstance(cluster_id, str):
+                    raise json.JSONDecodeError('Expecting a cluster id', stream.buffer, stream.pos)
+                stream.expect(':')
+                yield cluster_id, stream.value()
+
+                if stream.expect(',}') == '}':
+                    break
+
+        if stream.peek() is not None:
+            raise json.JSONDecodeError('Extra data', stream.buffer, stream.pos)